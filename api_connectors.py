@@ -1,83 +1,367 @@
 import os
+import time
 from datetime import datetime, timedelta
-from facebook_business.api import FacebookAdsApi
-from facebook_business.adobjects.adaccount import AdAccount
-from google.ads.googleads.client import GoogleAdsClient
-from google.ads.googleads.errors import GoogleAdsException
+from itertools import chain
+from operator import attrgetter
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
+from data_store import InsightsStore
+from instrumentation import count, timed
+from schema import compact, detect_source, normalize
+from transport import CircuitOpenError, call_with_retry, facebook_api, google_ads_client, google_service, resume_stream
 
 load_dotenv()
 
+# Os SDKs do Facebook e do Google são importados só ao criar o conector (o do Google leva segundos);
+# quem só processa CSV não paga esse custo
+
+ADDITIVE_METRICS = ['spend', 'impressions', 'clicks', 'conversions', 'reach', 'purchases',
+                    'video_p25', 'video_p50', 'video_p75', 'video_p100']
+
+FACEBOOK_INSIGHT_FIELDS = [
+    'campaign_id',
+    'campaign_name',
+    'spend',
+    'impressions',
+    'clicks',
+    'ctr',
+    'cpc',
+    'cpm',
+    'actions',
+    'reach',
+    'video_p25_watched_actions',
+    'video_p50_watched_actions',
+    'video_p75_watched_actions',
+    'video_p100_watched_actions'
+]
+
+# Colunas de visualização de vídeo e o campo de ações do Facebook de onde cada uma vem
+FACEBOOK_VIDEO_FIELDS = {
+    'video_p25': 'video_p25_watched_actions',
+    'video_p50': 'video_p50_watched_actions',
+    'video_p75': 'video_p75_watched_actions',
+    'video_p100': 'video_p100_watched_actions'
+}
+FACEBOOK_ACTION_ARRAYS = ['actions'] + list(FACEBOOK_VIDEO_FIELDS.values())
+ACTION_COLUMNS = ('conversions', 'purchases')
+
+
+def parse_action_mapping(value):
+    """'conversions:lead;purchases:purchase,omni_purchase' -> {coluna: [tipos de ação]}"""
+    mapping = {}
+    for entry in value.split(';'):
+        if not entry.strip():
+            continue
+        column, _, action_types = entry.partition(':')
+        column = column.strip()
+        if column not in ACTION_COLUMNS:
+            raise ValueError(f"Coluna de conversão inválida: {column}. Use uma de {ACTION_COLUMNS}")
+        mapping[column] = [action_type.strip() for action_type in action_types.split(',') if action_type.strip()]
+    return mapping
+
+
+# Tipos de ação somados em cada coluna de conversão. Tipos que se sobrepõem (ex.: purchase e
+# offsite_conversion.fb_pixel_purchase) não devem ser listados juntos na mesma coluna
+FACEBOOK_ACTION_MAPPING = parse_action_mapping(os.getenv('FACEBOOK_ACTION_MAPPING', 'conversions:lead;purchases:purchase'))
+
+# Relatórios estimados acima deste número de linhas usam jobs assíncronos (is_async=True)
+FACEBOOK_ASYNC_ROW_THRESHOLD = int(os.getenv('FACEBOOK_ASYNC_ROW_THRESHOLD', 5000))
+FACEBOOK_ASYNC_CHUNK_DAYS = int(os.getenv('FACEBOOK_ASYNC_CHUNK_DAYS', 14))
+FACEBOOK_ASYNC_POLL_SECONDS = float(os.getenv('FACEBOOK_ASYNC_POLL_SECONDS', 5))
+FACEBOOK_ASYNC_TIMEOUT_SECONDS = int(os.getenv('FACEBOOK_ASYNC_TIMEOUT_SECONDS', 900))
+FACEBOOK_ASYNC_PAGE_SIZE = 5000
+
+# Quebras disponíveis em ambos os conectores (ad_group corresponde ao conjunto de anúncios no Facebook)
+GRANULARITIES = ('daily', 'hourly')
+BREAKDOWNS = ('device', 'placement', 'ad_group')
+
+FACEBOOK_BREAKDOWNS = {
+    'device': ['device_platform'],
+    'placement': ['publisher_platform', 'platform_position']
+}
+FACEBOOK_HOURLY_BREAKDOWN = 'hourly_stats_aggregated_by_advertiser_time_zone'
+
+# search_stream entrega o resultado em lotes (até 10 mil linhas) em vez de páginas
+GOOGLE_ADS_USE_STREAM = os.getenv('GOOGLE_ADS_USE_STREAM', 'true').lower() not in ('0', 'false', 'no')
+MICROS = 1000000
+
+GOOGLE_DIMENSIONS = {
+    'hour': 'segments.hour',
+    'device': 'segments.device',
+    'placement': 'segments.ad_network_type',
+    'ad_group': 'ad_group.name'
+}
+
+def validate_granularity(granularity, breakdowns):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularidade inválida: {granularity}. Use uma de {GRANULARITIES}")
+    invalid = [breakdown for breakdown in breakdowns if breakdown not in BREAKDOWNS]
+    if invalid:
+        raise ValueError(f"Quebras inválidas: {invalid}. Use {BREAKDOWNS}")
+
+def to_long_format(df):
+    """Formato longo compacto: uma linha por dia (ou hora) x campanha x quebra, no esquema canônico
+
+    As métricas de razão (CTR, CPC, CPM) não são mantidas por linha; derive-as das somas.
+    Métricas aditivas que a origem não fornece (ex.: compras e vídeo no Google) ficam zeradas.
+    """
+    if df.empty:
+        return df
+    df = df.drop(columns=['ctr', 'cpc', 'cpm'], errors='ignore')
+    for column in ADDITIVE_METRICS:
+        if column not in df.columns:
+            df[column] = 0
+    return compact(df).reset_index(drop=True)
+
+def _collect(data):
+    """Junta em um só DataFrame o resultado de uma busca que pode ser gerada em lotes"""
+    if isinstance(data, pd.DataFrame):
+        return data
+    frames = [frame for frame in data if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def aggregate_by_campaign(df):
+    """Consolida os dados diários em uma linha por campanha, recalculando as métricas de razão"""
+    if df.empty:
+        return df
+    # Alcance diário somado é apenas uma aproximação do alcance único do período
+    metrics = [column for column in ADDITIVE_METRICS if column in df.columns]
+    df = df.groupby(['platform', 'campaign_name'], as_index=False, observed=True)[metrics].sum()
+    df['ctr'] = (df['clicks'] / df['impressions'] * 100).where(df['impressions'] > 0, 0)
+    df['cpc'] = (df['spend'] / df['clicks']).where(df['clicks'] > 0, 0)
+    df['cpm'] = (df['spend'] / df['impressions'] * 1000).where(df['impressions'] > 0, 0)
+    return compact(df)
+
 class FacebookAdsConnector:
-    def __init__(self):
+    def __init__(self, ad_account_id=None, store=None):
+        from facebook_business.adobjects.adaccount import AdAccount
         self.access_token = os.getenv('FACEBOOK_ACCESS_TOKEN')
         self.app_id = os.getenv('FACEBOOK_APP_ID')
         self.app_secret = os.getenv('FACEBOOK_APP_SECRET')
-        self.ad_account_id = os.getenv('FACEBOOK_AD_ACCOUNT_ID')
+        self.ad_account_id = ad_account_id or os.getenv('FACEBOOK_AD_ACCOUNT_ID')
         
-        FacebookAdsApi.init(self.app_id, self.app_secret, self.access_token)
-        self.account = AdAccount(self.ad_account_id)
+        # Sessão HTTP compartilhada entre as contas; cada requisição é repetida em falhas transitórias
+        self.api = facebook_api(self.app_id, self.app_secret, self.access_token, f"Facebook:{self.ad_account_id}")
+        self.account = AdAccount(self.ad_account_id, api=self.api)
+        self.store = store if store is not None else InsightsStore()
+        self.async_row_threshold = FACEBOOK_ASYNC_ROW_THRESHOLD
+        self.async_chunk_days = FACEBOOK_ASYNC_CHUNK_DAYS
     
     def get_campaigns_data(self, start_date, end_date):
+        """Retorna os dados por campanha, buscando na API apenas os dias ausentes do armazenamento local"""
         try:
-            fields = [
-                'campaign_name',
-                'spend',
-                'impressions',
-                'clicks',
-                'ctr',
-                'cpc',
-                'cpm',
-                'actions',
-                'reach',
-                'video_p25_watched_actions',
-                'video_p50_watched_actions',
-                'video_p75_watched_actions',
-                'video_p100_watched_actions'
-            ]
-            
-            params = {
-                'time_range': {
-                    'since': start_date.strftime('%Y-%m-%d'),
-                    'until': end_date.strftime('%Y-%m-%d')
-                },
-                'level': 'campaign'
-            }
-            
-            insights = self.account.get_insights(fields=fields, params=params)
-            data = []
-            
-            for insight in insights:
-                campaign_data = {
-                    'platform': 'Facebook',
-                    'campaign_name': insight['campaign_name'],
-                    'spend': float(insight.get('spend', 0)),
-                    'impressions': int(insight.get('impressions', 0)),
-                    'clicks': int(insight.get('clicks', 0)),
-                    'ctr': float(insight.get('ctr', 0)),
-                    'cpc': float(insight.get('cpc', 0)),
-                    'cpm': float(insight.get('cpm', 0)),
-                    'reach': int(insight.get('reach', 0)),
-                }
-                
-                # Processar conversões e ações
-                if 'actions' in insight:
-                    for action in insight['actions']:
-                        if action['action_type'] == 'lead':
-                            campaign_data['conversions'] = int(action['value'])
-                            break
-                
-                data.append(campaign_data)
-            
-            return pd.DataFrame(data)
+            return aggregate_by_campaign(self.sync_daily_data(start_date, end_date))
             
         except Exception as e:
             print(f"Erro ao obter dados do Facebook Ads: {str(e)}")
-            return pd.DataFrame()
+            # Mantém os dias já armazenados em vez de zerar o dashboard
+            return aggregate_by_campaign(self.store.load('Facebook', self.ad_account_id, start_date, end_date))
+    
+    def get_insights_data(self, start_date, end_date, granularity='daily', breakdowns=()):
+        """Retorna os dados em formato longo por dia (ou hora) e quebras opcionais; erros da API são propagados
+
+        Sem quebras, os dados diários vêm do armazenamento local; hora e quebras são buscadas na API.
+        """
+        validate_granularity(granularity, breakdowns)
+        if granularity == 'daily' and not breakdowns:
+            return to_long_format(self.sync_daily_data(start_date, end_date))
+        return to_long_format(_collect(self.fetch_daily_data(start_date, end_date, granularity, breakdowns)))
+    
+    def sync_daily_data(self, start_date, end_date, load=True):
+        """Sincroniza o armazenamento local e retorna os dados diários (None com `load=False`); erros da API são propagados"""
+        return self.store.sync('Facebook', self.ad_account_id, start_date, end_date, self.fetch_daily_data, load)
+    
+    def fetch_daily_data(self, start_date, end_date, granularity='daily', breakdowns=()):
+        """Busca na API os dados diários por campanha, escolhendo entre relatório síncrono ou assíncrono"""
+        fields, params, dimensions = self._report_spec(granularity, breakdowns)
+        estimated_rows = self.estimate_rows(start_date, end_date) * (24 if granularity == 'hourly' else 1) * 4 ** len(breakdowns)
+        if estimated_rows >= self.async_row_threshold:
+            return self.fetch_daily_data_async(start_date, end_date, fields, params, dimensions)
+        
+        with timed('facebook.insights', self.ad_account_id) as span:
+            requests_before, bytes_before = self._requests_attempted(), self._bytes_received()
+            insights = self.account.get_insights(fields=fields, params=self._insights_params(start_date, end_date, params))
+            df = insights_to_frame(insights, dimensions)
+            span.add(rows=len(df), pages=self._requests_attempted() - requests_before,
+                     bytes=self._bytes_received() - bytes_before)
+        return df
+    
+    def _requests_attempted(self):
+        """Requisições feitas por esta conexão com a API (uma por página de resultados)"""
+        return getattr(self.api, '_num_requests_attempted', 0)
+    
+    def _bytes_received(self):
+        """Tamanho acumulado das respostas recebidas por esta conexão com a API"""
+        return getattr(self.api, 'bytes_received', 0)
+    
+    def estimate_rows(self, start_date, end_date):
+        """Estima o número de linhas do relatório (campanhas x dias)"""
+        days = (end_date - start_date).days + 1
+        campaigns = self.store.campaign_count('Facebook', self.ad_account_id)
+        if not campaigns:
+            # Uma única requisição com o total de campanhas da conta
+            cursor = self.account.get_campaigns(fields=['id'], params={'limit': 1, 'summary': 'total_count'})
+            campaigns = cursor.total() or 0
+        return days * campaigns
+    
+    def fetch_daily_data_async(self, start_date, end_date, fields=None, params=None, dimensions=None):
+        """Divide o período em blocos, dispara um relatório assíncrono por bloco e retorna um DataFrame por relatório
+
+        Os relatórios são baixados à medida que concluem, mas só entregues quando todos terminarem:
+        quem consome os lotes (ex.: `InsightsStore.save`) não fica esperando entre um e outro.
+        """
+        from facebook_business.adobjects.adreportrun import AdReportRun
+        jobs = []
+        chunk_start = start_date
+        while chunk_start <= end_date:
+            chunk_end = min(end_date, chunk_start + timedelta(days=self.async_chunk_days - 1))
+            # Os relatórios são processados em paralelo pelo Facebook enquanto aguardamos
+            jobs.append(self.account.get_insights(
+                fields=fields or FACEBOOK_INSIGHT_FIELDS,
+                params=self._insights_params(chunk_start, chunk_end, params),
+                is_async=True
+            ))
+            chunk_start = chunk_end + timedelta(days=1)
+        
+        deadline = time.monotonic() + FACEBOOK_ASYNC_TIMEOUT_SECONDS
+        frames = []
+        while jobs:
+            count('facebook.async_poll', self.ad_account_id, pages=len(jobs))
+            pending = []
+            for job in jobs:
+                job.api_get()
+                status = job[AdReportRun.Field.async_status]
+                if status == 'Job Completed':
+                    # Download em lote: páginas grandes reduzem o número de requisições
+                    with timed('facebook.async_download', self.ad_account_id) as span:
+                        requests_before, bytes_before = self._requests_attempted(), self._bytes_received()
+                        df = insights_to_frame(job.get_result(params={'limit': FACEBOOK_ASYNC_PAGE_SIZE}), dimensions)
+                        span.add(rows=len(df), pages=self._requests_attempted() - requests_before,
+                                 bytes=self._bytes_received() - bytes_before)
+                    frames.append(df)
+                elif status in ('Job Failed', 'Job Skipped'):
+                    raise RuntimeError(f"Relatório assíncrono {job['id']} do Facebook terminou com status '{status}'")
+                else:
+                    pending.append(job)
+            jobs = pending
+            if jobs:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Relatórios assíncronos do Facebook não concluíram em {FACEBOOK_ASYNC_TIMEOUT_SECONDS}s")
+                time.sleep(FACEBOOK_ASYNC_POLL_SECONDS)
+        return frames
+    
+    def _report_spec(self, granularity, breakdowns):
+        """Campos, parâmetros extras e colunas de quebra do relatório para a granularidade pedida"""
+        validate_granularity(granularity, breakdowns)
+        fields = list(FACEBOOK_INSIGHT_FIELDS)
+        params = {}
+        dimensions = {}
+        api_breakdowns = []
+        
+        if granularity == 'hourly':
+            api_breakdowns.append(FACEBOOK_HOURLY_BREAKDOWN)
+            dimensions['hour'] = [FACEBOOK_HOURLY_BREAKDOWN]
+            # Alcance não é disponibilizado com a quebra por hora
+            fields.remove('reach')
+        
+        for breakdown in breakdowns:
+            if breakdown == 'ad_group':
+                params['level'] = 'adset'
+                fields += ['adset_id', 'adset_name']
+                dimensions['ad_group'] = ['adset_name']
+            else:
+                api_breakdowns += FACEBOOK_BREAKDOWNS[breakdown]
+                dimensions[breakdown] = FACEBOOK_BREAKDOWNS[breakdown]
+        
+        if api_breakdowns:
+            params['breakdowns'] = api_breakdowns
+        return fields, params, dimensions
+    
+    def _insights_params(self, start_date, end_date, extra_params=None):
+        params = {
+            'time_range': {
+                'since': start_date.strftime('%Y-%m-%d'),
+                'until': end_date.strftime('%Y-%m-%d')
+            },
+            'time_increment': 1,
+            'level': 'campaign'
+        }
+        params.update(extra_params or {})
+        return params
+
+def flatten_actions(records, fields=FACEBOOK_ACTION_ARRAYS):
+    """Achata de uma vez os arrays de ações (`actions`, vídeo) de todos os insights de uma página
+
+    Retorna um DataFrame alinhado a `records`, com uma coluna (campo, action_type) por tipo
+    de ação encontrado e a soma dos valores de cada linha.
+    """
+    size = len(records)
+    frames = {}
+    for field in fields:
+        arrays = [record.get(field) or () for record in records]
+        actions = list(chain.from_iterable(arrays))
+        if not actions:
+            continue
+        # Linha de origem de cada ação, sem criar uma tupla por ação
+        rows = np.repeat(np.arange(size), [len(array) for array in arrays])
+        codes, action_types = pd.factorize(np.array([action['action_type'] for action in actions], dtype=object))
+        values = np.array([action['value'] for action in actions], dtype='float64')
+        # Soma por (linha, tipo de ação) em uma matriz linhas x tipos
+        sums = np.bincount(rows * len(action_types) + codes, weights=values, minlength=size * len(action_types))
+        frames[field] = pd.DataFrame(sums.reshape(size, len(action_types)), columns=action_types)
+    if not frames:
+        return pd.DataFrame(index=pd.RangeIndex(size), columns=pd.MultiIndex.from_tuples([], names=['field', 'action_type']))
+    return pd.concat(frames, axis=1, names=['field', 'action_type'])
+
+def action_totals(wide, field, action_types=None):
+    """Soma por linha dos tipos de ação `action_types` (todos, se None) de um campo achatado"""
+    if field not in wide.columns.get_level_values('field'):
+        return np.zeros(len(wide))
+    columns = wide[field]
+    if action_types is not None:
+        columns = columns[[action_type for action_type in action_types if action_type in columns.columns]]
+    return columns.to_numpy(dtype='float64').sum(axis=1)
+
+def insights_to_frame(insights, dimensions=None, action_mapping=None):
+    """Converte os insights diários do Facebook em DataFrame
+
+    `dimensions` mapeia cada coluna de quebra para os campos do Facebook que a compõem;
+    `action_mapping` ({coluna: [tipos de ação]}, padrão FACEBOOK_ACTION_MAPPING) define as
+    colunas de conversão. As visualizações de vídeo viram as colunas video_p25 a video_p100.
+    """
+    records = list(insights)
+    if not records:
+        return pd.DataFrame()
+    action_mapping = FACEBOOK_ACTION_MAPPING if action_mapping is None else action_mapping
+    
+    # Uma lista por campo em vez de um dicionário por linha; os valores chegam como texto
+    df = pd.DataFrame({
+        'platform': 'Facebook',
+        'date': [record['date_start'] for record in records],
+        'campaign_id': [record.get('campaign_id') for record in records],
+        'campaign_name': [record['campaign_name'] for record in records]
+    })
+    for field in ('spend', 'impressions', 'clicks', 'ctr', 'cpc', 'cpm', 'reach'):
+        dtype = 'int64' if field in ('impressions', 'clicks', 'reach') else 'float64'
+        df[field] = np.array([record.get(field, 0) for record in records], dtype=dtype)
+    
+    wide = flatten_actions(records)
+    for column in ACTION_COLUMNS:
+        df[column] = action_totals(wide, 'actions', action_mapping.get(column, []))
+    for column, field in FACEBOOK_VIDEO_FIELDS.items():
+        df[column] = action_totals(wide, field).astype('int64')
+    
+    for column, keys in (dimensions or {}).items():
+        df[column] = [' / '.join(str(record.get(key, '')) for key in keys) for record in records]
+    
+    if 'hour' in df.columns:
+        # "00:00:00 - 00:59:59" -> 0
+        df['hour'] = df['hour'].str[:2].astype('int8')
+    return df
 
 class GoogleAdsConnector:
-    def __init__(self):
+    def __init__(self, customer_id=None, store=None):
         # Configuração específica para resolver o erro do use_proto_plus
         client_config = {
             'use_proto_plus': True,  # Adicionando a configuração necessária
@@ -85,57 +369,197 @@ class GoogleAdsConnector:
             'client_id': os.getenv('GOOGLE_ADS_CLIENT_ID'),
             'client_secret': os.getenv('GOOGLE_ADS_CLIENT_SECRET'),
             'refresh_token': os.getenv('GOOGLE_ADS_REFRESH_TOKEN'),
-            'login_customer_id': os.getenv('GOOGLE_ADS_CUSTOMER_ID')
+            # Conta administradora (MCC) usada para acessar as contas gerenciadas
+            'login_customer_id': os.getenv('GOOGLE_ADS_LOGIN_CUSTOMER_ID') or os.getenv('GOOGLE_ADS_CUSTOMER_ID')
         }
-        self.client = GoogleAdsClient.load_from_dict(client_config)
-        self.customer_id = os.getenv('GOOGLE_ADS_CUSTOMER_ID')
+        # Cliente (e canais gRPC) compartilhado entre as contas com as mesmas credenciais
+        self.client = google_ads_client(client_config)
+        self.customer_id = customer_id or os.getenv('GOOGLE_ADS_CUSTOMER_ID')
+        self.transport_name = f"Google:{self.customer_id}"
+        self.store = store if store is not None else InsightsStore()
+        self.use_stream = GOOGLE_ADS_USE_STREAM
     
     def get_campaigns_data(self, start_date, end_date):
+        """Retorna os dados por campanha, buscando na API apenas os dias ausentes do armazenamento local"""
+        from google.ads.googleads.errors import GoogleAdsException
         try:
-            query = """
-                SELECT
-                    campaign.name,
-                    metrics.impressions,
-                    metrics.clicks,
-                    metrics.cost_micros,
-                    metrics.conversions,
-                    metrics.average_cpc,
-                    metrics.ctr,
-                    metrics.average_cpm
-                FROM campaign
-                WHERE segments.date BETWEEN '{start_date}' AND '{end_date}'
-            """.format(
-                start_date=start_date.strftime('%Y-%m-%d'),
-                end_date=end_date.strftime('%Y-%m-%d')
-            )
-            
-            ga_service = self.client.get_service("GoogleAdsService")
-            response = ga_service.search(customer_id=self.customer_id, query=query)
-            
-            data = []
-            for row in response:
-                campaign_data = {
-                    'platform': 'Google',
-                    'campaign_name': row.campaign.name,
-                    'spend': row.metrics.cost_micros / 1000000,
-                    'impressions': row.metrics.impressions,
-                    'clicks': row.metrics.clicks,
-                    'ctr': row.metrics.ctr,
-                    'cpc': row.metrics.average_cpc / 1000000,
-                    'cpm': row.metrics.average_cpm / 1000000,
-                    'conversions': row.metrics.conversions
-                }
-                data.append(campaign_data)
-            
-            return pd.DataFrame(data)
+            return aggregate_by_campaign(self.sync_daily_data(start_date, end_date))
             
-        except GoogleAdsException as e:
+        except (GoogleAdsException, CircuitOpenError) as e:
             print(f"Erro ao obter dados do Google Ads: {str(e)}")
-            return pd.DataFrame()
+            # Mantém os dias já armazenados em vez de zerar o dashboard
+            return aggregate_by_campaign(self.store.load('Google', self.customer_id, start_date, end_date))
+    
+    def get_insights_data(self, start_date, end_date, granularity='daily', breakdowns=()):
+        """Retorna os dados em formato longo por dia (ou hora) e quebras opcionais; erros da API são propagados
+
+        Sem quebras, os dados diários vêm do armazenamento local; hora e quebras são buscadas na API.
+        """
+        validate_granularity(granularity, breakdowns)
+        if granularity == 'daily' and not breakdowns:
+            return to_long_format(self.sync_daily_data(start_date, end_date))
+        return to_long_format(_collect(self.fetch_daily_data(start_date, end_date, granularity, breakdowns)))
+    
+    def sync_daily_data(self, start_date, end_date, load=True):
+        """Sincroniza o armazenamento local e retorna os dados diários (None com `load=False`); erros da API são propagados"""
+        return self.store.sync('Google', self.customer_id, start_date, end_date, self.fetch_daily_data, load)
+    
+    def fetch_daily_data(self, start_date, end_date, granularity='daily', breakdowns=()):
+        """Busca na API os dados diários por campanha no intervalo"""
+        validate_granularity(granularity, breakdowns)
+        if self.use_stream or granularity != 'daily' or breakdowns:
+            return self.stream_daily_data(start_date, end_date, granularity, breakdowns)
+        
+        ga_service = google_service(self.client, "GoogleAdsService")
+        request = self.client.get_type("SearchGoogleAdsRequest")
+        request.customer_id = self.customer_id
+        request.query = self._daily_query(start_date, end_date)
+        rows = []
+        with timed('google.search', self.customer_id) as span:
+            # Página a página: uma falha repete só a página, não a busca inteira
+            while True:
+                page = call_with_retry(lambda: next(iter(ga_service.search(request=request).pages)), self.transport_name)
+                rows.extend(page.results)
+                span.add(pages=1)
+                if not page.next_page_token:
+                    break
+                request.page_token = page.next_page_token
+            span.add(rows=len(rows))
+        
+        data = []
+        for row in rows:
+            campaign_data = {
+                'platform': 'Google',
+                'date': row.segments.date,
+                'campaign_id': str(row.campaign.id),
+                'campaign_name': row.campaign.name,
+                'spend': row.metrics.cost_micros / MICROS,
+                'impressions': row.metrics.impressions,
+                'clicks': row.metrics.clicks,
+                'ctr': row.metrics.ctr,
+                'cpc': row.metrics.average_cpc / MICROS,
+                'cpm': row.metrics.average_cpm / MICROS,
+                'conversions': row.metrics.conversions
+            }
+            data.append(campaign_data)
+        
+        return pd.DataFrame(data)
+    
+    def stream_daily_data(self, start_date, end_date, granularity='daily', breakdowns=()):
+        """Gera um DataFrame por lote do search_stream, mantendo a memória limitada ao tamanho do lote
+
+        Se o stream cair, ele é reaberto e as linhas já entregues são descartadas (a consulta é ordenada).
+        """
+        dimensions = (['hour'] if granularity == 'hourly' else []) + list(breakdowns)
+        query = self._daily_query(start_date, end_date, dimensions, ordered=True)
+        return resume_stream(lambda delivered: self._open_stream(query, dimensions, delivered), self.transport_name)
+    
+    def _open_stream(self, query, dimensions, skip_rows=0):
+        ga_service = google_service(self.client, "GoogleAdsService")
+        stream = ga_service.search_stream(customer_id=self.customer_id, query=query)
+        for batch in stream:
+            with timed('google.stream_batch', self.customer_id) as span:
+                df = decode_stream_batch(batch, dimensions)
+                span.add(rows=len(df), pages=1, bytes=type(batch).pb(batch).ByteSize())
+            if skip_rows >= len(df):
+                skip_rows -= len(df)
+                continue
+            if skip_rows:
+                df = df.iloc[skip_rows:].reset_index(drop=True)
+                skip_rows = 0
+            yield df
+    
+    def _daily_query(self, start_date, end_date, dimensions=(), ordered=False):
+        # Com quebra por grupo de anúncios a consulta passa a ser feita no recurso ad_group
+        resource = 'ad_group' if 'ad_group' in dimensions else 'campaign'
+        dimension_fields = ''.join(f"\n                {GOOGLE_DIMENSIONS[dimension]}," for dimension in dimensions)
+        if 'ad_group' in dimensions:
+            # Nomes podem se repetir; o id desempata a ordenação
+            dimension_fields += "\n                ad_group.id,"
+        # Ordem total (uma linha por chave) para que o stream possa ser retomado no mesmo ponto
+        order_fields = ['segments.date', 'campaign.id'] + [
+            'ad_group.id' if dimension == 'ad_group' else GOOGLE_DIMENSIONS[dimension] for dimension in dimensions
+        ]
+        order_by = f"\n            ORDER BY {', '.join(order_fields)}" if ordered else ''
+        return """
+            SELECT
+                segments.date,{dimension_fields}
+                campaign.id,
+                campaign.name,
+                metrics.impressions,
+                metrics.clicks,
+                metrics.cost_micros,
+                metrics.conversions,
+                metrics.average_cpc,
+                metrics.ctr,
+                metrics.average_cpm
+            FROM {resource}
+            WHERE segments.date BETWEEN '{start_date}' AND '{end_date}'{order_by}
+        """.format(
+            dimension_fields=dimension_fields,
+            resource=resource,
+            order_by=order_by,
+            start_date=start_date.strftime('%Y-%m-%d'),
+            end_date=end_date.strftime('%Y-%m-%d')
+        )
+
+def _column(rows, field, dtype):
+    return np.fromiter(map(attrgetter(field), rows), dtype=dtype, count=len(rows))
+
+def _enum_column(rows, field):
+    """Converte um campo enum do protobuf em categoria com os nomes dos valores"""
+    codes = _column(rows, field, np.int32)
+    if not len(rows):
+        return pd.Categorical([])
+    message_name, field_name = field.rsplit('.', 1)
+    descriptor = attrgetter(message_name)(rows[0]).DESCRIPTOR.fields_by_name[field_name].enum_type
+    names = {value.number: value.name for value in descriptor.values}
+    return pd.Categorical(pd.Series(codes).map(names))
+
+def decode_stream_batch(batch, dimensions=()):
+    """Converte um lote do search_stream diretamente em colunas, sem criar um dicionário por linha"""
+    # Protobuf cru: o acesso a atributos é bem mais rápido que pelos wrappers proto-plus
+    rows = type(batch).pb(batch).results
+    
+    # Conversão de micros feita de uma vez para as três colunas monetárias
+    micros = np.column_stack([
+        _column(rows, 'metrics.cost_micros', np.float64),
+        _column(rows, 'metrics.average_cpc', np.float64),
+        _column(rows, 'metrics.average_cpm', np.float64)
+    ]) / MICROS
+    
+    columns = {
+        'platform': 'Google',
+        'date': [row.segments.date for row in rows],
+        'campaign_id': _column(rows, 'campaign.id', np.int64).astype(str),
+        'campaign_name': [row.campaign.name for row in rows],
+    }
+    for dimension in dimensions:
+        field = GOOGLE_DIMENSIONS[dimension]
+        if dimension == 'hour':
+            columns['hour'] = _column(rows, field, np.int8)
+        elif dimension == 'ad_group':
+            columns['ad_group'] = [row.ad_group.name for row in rows]
+        else:
+            columns[dimension] = _enum_column(rows, field)
+    
+    columns.update({
+        'spend': micros[:, 0],
+        'impressions': _column(rows, 'metrics.impressions', np.int64),
+        'clicks': _column(rows, 'metrics.clicks', np.int64),
+        'ctr': _column(rows, 'metrics.ctr', np.float64),
+        'cpc': micros[:, 1],
+        'cpm': micros[:, 2],
+        'conversions': _column(rows, 'metrics.conversions', np.float64)
+    })
+    return pd.DataFrame(columns)
 
 def load_csv_data(file_path, platform):
     try:
         df = pd.read_csv(file_path)
+        source = detect_source(df.columns, platform)
+        if source:
+            return normalize(df, source)
         df['platform'] = platform
         return df
     except Exception as e:
@@ -146,31 +570,12 @@ def process_facebook_csv(file):
     """Processa arquivo CSV do Facebook Ads"""
     try:
         df = pd.read_csv(file)
-        required_columns = ['campaign_name', 'spend', 'impressions', 'clicks', 'ctr', 'cpc', 'cpm', 'reach']
         
         # Verifica se as colunas necessárias existem
-        if not all(col in df.columns for col in required_columns):
+        if detect_source(df.columns, 'Facebook') != 'facebook_csv':
             raise ValueError("O arquivo CSV do Facebook não contém todas as colunas necessárias")
         
-        # Adiciona a coluna de plataforma
-        df['platform'] = 'Facebook'
-        
-        # Garante que os tipos de dados estão corretos
-        df['spend'] = pd.to_numeric(df['spend'], errors='coerce')
-        df['impressions'] = pd.to_numeric(df['impressions'], errors='coerce')
-        df['clicks'] = pd.to_numeric(df['clicks'], errors='coerce')
-        df['ctr'] = pd.to_numeric(df['ctr'], errors='coerce')
-        df['cpc'] = pd.to_numeric(df['cpc'], errors='coerce')
-        df['cpm'] = pd.to_numeric(df['cpm'], errors='coerce')
-        df['reach'] = pd.to_numeric(df['reach'], errors='coerce')
-        
-        # Adiciona coluna de conversões se existir
-        if 'conversions' in df.columns:
-            df['conversions'] = pd.to_numeric(df['conversions'], errors='coerce')
-        else:
-            df['conversions'] = 0
-            
-        return df
+        return normalize(df, 'facebook_csv')
         
     except Exception as e:
         print(f"Erro ao processar arquivo CSV do Facebook: {str(e)}")
@@ -180,44 +585,13 @@ def process_google_csv(file):
     """Processa arquivo CSV do Google Ads"""
     try:
         df = pd.read_csv(file)
-        required_columns = ['campaign_name', 'cost', 'impressions', 'clicks', 'ctr', 'avg_cpc', 'avg_cpm']
         
         # Verifica se as colunas necessárias existem
-        if not all(col in df.columns for col in required_columns):
+        if detect_source(df.columns, 'Google') != 'google_csv':
             raise ValueError("O arquivo CSV do Google Ads não contém todas as colunas necessárias")
         
-        # Adiciona a coluna de plataforma
-        df['platform'] = 'Google'
-        
-        # Renomeia colunas para padronizar com o Facebook
-        df = df.rename(columns={
-            'cost': 'spend',
-            'avg_cpc': 'cpc',
-            'avg_cpm': 'cpm'
-        })
-        
-        # Garante que os tipos de dados estão corretos
-        df['spend'] = pd.to_numeric(df['spend'], errors='coerce')
-        df['impressions'] = pd.to_numeric(df['impressions'], errors='coerce')
-        df['clicks'] = pd.to_numeric(df['clicks'], errors='coerce')
-        df['ctr'] = pd.to_numeric(df['ctr'], errors='coerce')
-        df['cpc'] = pd.to_numeric(df['cpc'], errors='coerce')
-        df['cpm'] = pd.to_numeric(df['cpm'], errors='coerce')
-        
-        # Adiciona coluna de conversões se existir
-        if 'conversions' in df.columns:
-            df['conversions'] = pd.to_numeric(df['conversions'], errors='coerce')
-        else:
-            df['conversions'] = 0
-            
-        # Adiciona coluna de alcance se existir
-        if 'reach' in df.columns:
-            df['reach'] = pd.to_numeric(df['reach'], errors='coerce')
-        else:
-            df['reach'] = df['impressions']  # Usa impressões como aproximação
-            
-        return df
+        return normalize(df, 'google_csv')
         
     except Exception as e:
         print(f"Erro ao processar arquivo CSV do Google Ads: {str(e)}")
-        return pd.DataFrame() 
\ No newline at end of file
+        return pd.DataFrame()
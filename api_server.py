@@ -0,0 +1,326 @@
+import argparse
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from dotenv import load_dotenv
+from data_store import InsightsStore
+from instrumentation import count, timed
+from query_engine import InsightsQuery
+
+load_dotenv()
+
+API_HOST = os.getenv('API_HOST', '127.0.0.1')
+API_PORT = int(os.getenv('API_PORT', 8502))
+# Tempo em que uma resposta é reaproveitada (servidor) e pode ser guardada pelo cliente (max-age)
+API_CACHE_SECONDS = int(os.getenv('API_CACHE_SECONDS', 60))
+API_CACHE_MAX_ENTRIES = int(os.getenv('API_CACHE_MAX_ENTRIES', 256))
+# Respostas menores que isso não compensam a compressão
+API_GZIP_MIN_BYTES = int(os.getenv('API_GZIP_MIN_BYTES', 1024))
+# Origens liberadas para navegadores (ex.: o front end React em http://localhost:8080), separadas por vírgula
+API_ALLOWED_ORIGINS = [origin.strip() for origin in os.getenv('API_ALLOWED_ORIGINS', '').split(',') if origin.strip()]
+# Se definido, toda requisição precisa enviar "Authorization: Bearer <token>"
+API_TOKEN = os.getenv('API_TOKEN')
+
+DEFAULT_DAYS = 30
+GRANULARITIES = ('date', 'week', 'month')
+SERIES_DIMENSIONS = ('platform', 'account_id')
+FORMATS = {
+    'json': 'application/json',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+
+def _values(params, name):
+    """Valores de um parâmetro repetido ou separado por vírgula"""
+    return [value.strip() for raw in params.get(name, []) for value in raw.split(',') if value.strip()]
+
+
+def _date(params, name, default):
+    values = _values(params, name)
+    if not values:
+        return default
+    try:
+        return date.fromisoformat(values[0])
+    except ValueError:
+        raise ValueError(f"Data inválida em '{name}': {values[0]}. Use AAAA-MM-DD")
+
+
+def parse_filters(params):
+    """Período, contas e plataformas da query string, no formato usado pelo InsightsQuery
+
+    Sem `account`, os arquivos importados no painel só entram com `uploads=1`.
+    """
+    end_date = _date(params, 'end', date.today())
+    start_date = _date(params, 'start', end_date - timedelta(days=DEFAULT_DAYS))
+    if start_date > end_date:
+        raise ValueError('A data inicial deve ser anterior à data final')
+
+    accounts = None
+    if 'account' in params:
+        accounts = []
+        for value in _values(params, 'account'):
+            platform, _, account_id = value.partition(':')
+            if not account_id:
+                raise ValueError(f"Conta inválida: {value}. Use plataforma:id (ex.: Facebook:123)")
+            accounts.append((platform, account_id))
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'accounts': accounts,
+        'platforms': _values(params, 'platform') or None,
+        'include_uploads': (_values(params, 'uploads') or ['0'])[0].lower() in ('1', 'true')
+    }
+
+
+def _iso_dates(df):
+    df = df.copy()
+    for column in GRANULARITIES:
+        if column in df.columns:
+            df[column] = df[column].dt.strftime('%Y-%m-%d')
+    return df
+
+
+def encode_frame(df, fmt):
+    """JSON colunar compacto ({"columns": [...], "data": [[...]]}) ou Arrow IPC (stream)"""
+    if fmt == 'arrow':
+        df = df.copy()
+        for column in GRANULARITIES:
+            if column in df.columns:
+                df[column] = df[column].dt.date
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    return _iso_dates(df).to_json(orient='split', index=False, double_precision=6).encode('utf-8')
+
+
+def encode_json(payload):
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class ResponseCache:
+    """Respostas já serializadas, por rota + parâmetros + versão do banco
+
+    Enquanto o armazenamento local não muda, clientes consultando em intervalos curtos
+    recebem os mesmos bytes (e o mesmo ETag) sem nova consulta; a versão gzip é gerada
+    uma única vez, no primeiro cliente que a aceitar.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or API_CACHE_MAX_ENTRIES
+        self.ttl = API_CACHE_SECONDS if ttl is None else ttl
+        self._entries = OrderedDict()
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry['created'] > self.ttl:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get_or_create(self, key, build):
+        """Entrada {'body', 'etag', ...} da chave; `build()` roda uma vez mesmo com clientes simultâneos"""
+        entry = self._get(key)
+        if entry is None:
+            with self._key_lock(key):
+                entry = self._get(key)
+                if entry is None:
+                    count('api.cache', cache_misses=1)
+                    body = build()
+                    entry = {
+                        'body': body,
+                        'gzip': None,
+                        'etag': f'W/"{hashlib.sha1(body).hexdigest()[:20]}"',
+                        'created': time.monotonic()
+                    }
+                    with self._lock:
+                        self._entries[key] = entry
+                        while len(self._entries) > self.max_entries:
+                            stale, _ = self._entries.popitem(last=False)
+                            self._locks.pop(stale, None)
+                    return entry
+        count('api.cache', cache_hits=1)
+        return entry
+
+    def gzipped(self, entry):
+        if entry['gzip'] is None:
+            entry['gzip'] = gzip.compress(entry['body'], compresslevel=6)
+        return entry['gzip']
+
+
+class AggregateAPI:
+    """KPIs e séries temporais pré-agregadas do armazenamento local, sem passar pela interface
+
+    Só lê o banco: as buscas nas APIs do Facebook e do Google continuam com o painel e com
+    `prefetch.py`, que mantém as janelas padrão atualizadas.
+    """
+
+    def __init__(self, store=None, cache=None):
+        self.store = store if store is not None else InsightsStore()
+        self.query = InsightsQuery(self.store)
+        self.cache = cache if cache is not None else ResponseCache()
+        self.routes = {
+            '/api/kpis': self.kpis,
+            '/api/timeseries': self.timeseries
+        }
+
+    def kpis(self, params, fmt):
+        """Mesmas chaves de `calculate_metrics`; `kpis` é null quando não há dados no período"""
+        filters = parse_filters(params)
+        kpis = self.query.totals(**filters)
+        if fmt == 'arrow':
+            return encode_frame(pd.DataFrame([kpis] if kpis else []), fmt)
+        return encode_json({
+            'start_date': filters['start_date'].isoformat(),
+            'end_date': filters['end_date'].isoformat(),
+            'kpis': kpis
+        })
+
+    def timeseries(self, params, fmt):
+        """Somas e CTR/CPC/CPM por dia, semana ou mês, opcionalmente por plataforma ou conta"""
+        filters = parse_filters(params)
+        granularity = (_values(params, 'granularity') or ['date'])[0]
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularidade inválida: {granularity}. Use uma de {list(GRANULARITIES)}")
+        by = _values(params, 'by')
+        invalid = [dimension for dimension in by if dimension not in SERIES_DIMENSIONS]
+        if invalid:
+            raise ValueError(f"Agrupamentos inválidos: {invalid}. Use {list(SERIES_DIMENSIONS)}")
+        df = self.query.aggregate(dimensions=(granularity, *by), **filters)
+        return encode_frame(df, fmt)
+
+    def respond(self, path, params):
+        """(status, entrada do cache ou None, corpo de erro, tipo) de uma requisição GET"""
+        if path == '/api/health':
+            return 200, None, encode_json({'status': 'ok'}), FORMATS['json']
+        handler = self.routes.get(path)
+        if handler is None:
+            return 404, None, encode_json({'error': f"Rota desconhecida: {path}", 'routes': list(self.routes)}), FORMATS['json']
+        fmt = (_values(params, 'format') or ['json'])[0]
+        if fmt not in FORMATS:
+            return 400, None, encode_json({'error': f"Formato inválido: {fmt}. Use {list(FORMATS)}"}), FORMATS['json']
+
+        key = (path, fmt, tuple(sorted((name, tuple(values)) for name, values in params.items() if name != 'format')),
+               self.store.data_version())
+        try:
+            with timed(f"api.{path.rsplit('/', 1)[-1]}") as span:
+                entry = self.cache.get_or_create(key, lambda: handler(params, fmt))
+                span.add(bytes=len(entry['body']))
+        except ValueError as e:
+            return 400, None, encode_json({'error': str(e)}), FORMATS['json']
+        return 200, entry, None, FORMATS[fmt]
+
+
+class APIRequestHandler(BaseHTTPRequestHandler):
+    api = None
+    protocol_version = 'HTTP/1.1'
+
+    def _cors_headers(self):
+        origin = self.headers.get('Origin')
+        if origin and (origin in API_ALLOWED_ORIGINS or '*' in API_ALLOWED_ORIGINS):
+            self.send_header('Access-Control-Allow-Origin', origin)
+            self.send_header('Access-Control-Expose-Headers', 'ETag')
+            self.send_header('Vary', 'Origin, Accept-Encoding')
+        else:
+            self.send_header('Vary', 'Accept-Encoding')
+
+    def _send(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self._cors_headers()
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _authorized(self):
+        # Comparação em tempo constante: o tempo de resposta não revela quanto do token confere.
+        # O http.server decodifica os cabeçalhos como latin-1; reencodar devolve os bytes enviados
+        return not API_TOKEN or hmac.compare_digest(self.headers.get('Authorization', '').encode('latin-1'),
+                                                    f"Bearer {API_TOKEN}".encode('utf-8'))
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Methods', 'GET, HEAD, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Authorization, If-None-Match')
+        self.send_header('Access-Control-Max-Age', '86400')
+        self.send_header('Content-Length', '0')
+        self._cors_headers()
+        self.end_headers()
+
+    def do_GET(self):
+        if not self._authorized():
+            self._send(401, encode_json({'error': 'Token inválido ou ausente'}), FORMATS['json'],
+                       [('WWW-Authenticate', 'Bearer')])
+            return
+        url = urlsplit(self.path)
+        try:
+            status, entry, body, content_type = self.api.respond(url.path.rstrip('/'), parse_qs(url.query))
+        except Exception as e:
+            print(f"Erro na API ao atender {self.path}: {str(e)}", flush=True)
+            self._send(500, encode_json({'error': 'Erro interno'}), FORMATS['json'])
+            return
+        if entry is None:
+            self._send(status, body, content_type, [('Cache-Control', 'no-store')])
+            return
+
+        headers = [('ETag', entry['etag']), ('Cache-Control', f"private, max-age={API_CACHE_SECONDS}")]
+        if_none_match = self.headers.get('If-None-Match', '')
+        if entry['etag'] in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+            self.send_response(304)
+            for name, value in headers:
+                self.send_header(name, value)
+            self._cors_headers()
+            self.end_headers()
+            return
+
+        body = entry['body']
+        if len(body) >= API_GZIP_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = self.api.cache.gzipped(entry)
+            headers.append(('Content-Encoding', 'gzip'))
+        self._send(status, body, content_type, headers)
+
+    do_HEAD = do_GET
+
+
+def serve(host=None, port=None, api=None):
+    """Atende até ser interrompido (Ctrl+C); cada requisição roda na própria thread"""
+    APIRequestHandler.api = api if api is not None else AggregateAPI()
+    server = ThreadingHTTPServer((host or API_HOST, port or API_PORT), APIRequestHandler)
+    print(f"API de agregados em http://{server.server_address[0]}:{server.server_address[1]}/api", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='API HTTP com os KPIs e séries temporais do armazenamento local')
+    parser.add_argument('--host', default=API_HOST)
+    parser.add_argument('--port', type=int, default=API_PORT)
+    args = parser.parse_args()
+    serve(args.host, args.port)
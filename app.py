@@ -1,11 +1,20 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from base64 import b64encode
 from datetime import datetime
-import io
-from openpyxl import Workbook
+import os
+import tempfile
+from chart_data import prepare_line_data, use_webgl
+from data_cache import get_query_engine, get_store, load_insights, load_metrics, refresh_data, sync_store
+from data_store import UPLOAD_ACCOUNT_PREFIX
+from exporters import EXPORT_FORMATS, export_chunks, iter_store_chunks
+from fetch_engine import configured_accounts
+from ingestion import file_hash, ingest_file
+from instrumentation import RECORDER, instrumented
+from schema import SOURCES, detect_source, normalize
+from utils import (create_campaign_distribution, create_date_filters, create_drilldown_filters, create_performance_chart,
+                   create_platform_comparison, create_platform_filter, format_currency,
+                   format_number, format_percentage)
 
 # Configuração da página
 st.set_page_config(
@@ -15,129 +24,37 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Estilo CSS personalizado
-st.markdown("""
-    <style>
-    /* Tema escuro personalizado */
-    [data-testid="stAppViewContainer"] {
-        background: linear-gradient(180deg, #1E1B2E 0%, #2D1A4D 100%);
-        color: white;
-    }
-    
-    .stApp {
-        background: transparent;
-    }
-    
-    /* Barra lateral estilizada */
-    [data-testid="stSidebar"] {
-        background: #2D1A4D;
-        border-right: 1px solid rgba(255, 255, 255, 0.1);
-    }
-    
-    [data-testid="stSidebar"] [data-testid="stVerticalBlock"] {
-        padding: 0 1rem;
-    }
-    
-    /* Logo container */
-    .logo-container {
-        text-align: center;
-        padding: 2rem 1rem;
-    }
-    
-    .logo-container img {
-        width: 150px;
-        margin-bottom: 1rem;
-    }
-
-    /* Título da Plataforma */
-    .platform-title {
-        color: white;
-        font-size: 1.2rem;
-        font-weight: 500;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-
-    /* Botões do menu */
-    [data-testid="stSidebar"] [data-testid="stButton"] {
-        width: 100%;
-        margin-bottom: 0.5rem;
-    }
+# Estilo CSS personalizado: static/style.css é servido pelo Streamlit (com cache do navegador) e
+# aplicado uma vez por página; a cada execução só este carregador passa pelo websocket.
+# Um <link> direto não serve: arquivos estáticos que não são imagens saem como text/plain (nosniff)
+STYLE_LOADER = """
+<script>
+const doc = window.parent.document;
+if (!doc.getElementById("app-style")) {
+    const style = doc.createElement("style");
+    style.id = "app-style";
+    doc.head.appendChild(style);
+    fetch(new URL("app/static/style.css", doc.baseURI))
+        .then((response) => response.text())
+        .then((css) => { style.textContent = css; });
+}
+</script>
+"""
+components.html(STYLE_LOADER, height=0)
 
-    [data-testid="stSidebar"] button {
-        width: 100%;
-        background: rgba(255, 255, 255, 0.05);
-        color: white;
-        border: none;
-        border-radius: 8px;
-        padding: 0.75rem 1rem;
-        cursor: pointer;
-        display: flex;
-        align-items: center;
-        gap: 0.5rem;
-        transition: all 0.3s ease;
-    }
-
-    [data-testid="stSidebar"] button:hover {
-        background: rgba(255, 255, 255, 0.1);
-    }
-
-    [data-testid="stSidebar"] button.active {
-        background: rgba(255, 255, 255, 0.1);
-        border: 1px solid rgba(255, 255, 255, 0.2);
-    }
-
-    /* Container principal */
-    .main-content {
-        padding: 2rem;
-    }
-
-    /* Esconde o menu hamburguer */
-    [data-testid="collapsedControl"] {
-        display: none;
-    }
-    </style>
-""", unsafe_allow_html=True)
+BREAKDOWN_LABELS = {
+    None: "Nenhuma",
+    "device": "Dispositivo",
+    "placement": "Posicionamento",
+    "ad_group": "Conjunto/grupo de anúncios"
+}
 
 def process_facebook_data(df):
     """Processa e valida os dados do Facebook Ads"""
     try:
-        # Mapeamento de colunas do Facebook Ads
-        column_mapping = {
-            "Nome da campanha": "campaign_name",
-            "Valor usado (BRL)": "spend",
-            "Impressões": "impressions",
-            "Cliques no link": "clicks",
-            "CTR (taxa de cliques no link)": "ctr",
-            "CPC (custo por clique no link)": "cpc",
-            "CPM (custo por 1.000 impressões)": "cpm",
-            "Alcance": "reach",
-            "Resultados": "conversions",
-            # Adicionando mapeamentos alternativos comuns
-            "Campaign name": "campaign_name",
-            "Amount spent (BRL)": "spend",
-            "Link clicks": "clicks",
-            "CTR (Link click-through rate)": "ctr",
-            "CPC (Cost per link click)": "cpc",
-            "Impressions": "impressions",
-            "Reach": "reach",
-            "Results": "conversions"
-        }
-        
         # Verifica quais colunas obrigatórias estão presentes (usando ambos os nomes possíveis)
-        required_columns_pt = [
-            "Nome da campanha",
-            "Valor usado (BRL)",
-            "Impressões",
-            "Cliques no link"
-        ]
-        
-        required_columns_en = [
-            "Campaign name",
-            "Amount spent (BRL)",
-            "Impressions",
-            "Link clicks"
-        ]
+        required_columns_pt = SOURCES["facebook_csv_pt"]["required"]
+        required_columns_en = SOURCES["facebook_csv_en"]["required"]
         
         # Verifica se as colunas estão presentes em português ou inglês
         missing_columns = []
@@ -156,39 +73,16 @@ def process_facebook_data(df):
             """)
             return None
         
-        # Renomeia as colunas presentes
-        columns_to_rename = {old: new for old, new in column_mapping.items() if old in df.columns}
-        df = df.rename(columns=columns_to_rename)
-        
-        # Converte valores para formato numérico
-        if "spend" in df.columns:
-            df["spend"] = df["spend"].astype(str).str.replace("R$", "").str.replace(".", "").str.replace(",", ".").astype(float)
-        if "cpc" in df.columns:
-            df["cpc"] = df["cpc"].astype(str).str.replace("R$", "").str.replace(".", "").str.replace(",", ".").astype(float)
-        if "cpm" in df.columns:
-            df["cpm"] = df["cpm"].astype(str).str.replace("R$", "").str.replace(".", "").str.replace(",", ".").astype(float)
+        # Renomeia, converte os números (moeda, milhar e CTR em fração) e compacta os tipos
+        df = normalize(df, detect_source(df.columns, "Facebook"))
         
-        # Remove % e converte CTR
-        if "ctr" in df.columns:
-            df["ctr"] = df["ctr"].astype(str).str.rstrip("%").astype(float) / 100
+        failures = df.attrs['parse_failures']
+        if failures:
+            st.warning(
+                f"⚠️ {sum(failures.values())} célula(s) não puderam ser convertidas em número e foram zeradas: "
+                + ", ".join(f"{column} ({count})" for column, count in failures.items())
+            )
         
-        # Converte valores inteiros
-        numeric_columns = ["impressions", "clicks", "reach", "conversions"]
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col].astype(str).str.replace(".", ""), errors="coerce")
-        
-        # Se não tiver coluna de conversões, cria com zeros
-        if "conversions" not in df.columns:
-            df["conversions"] = 0
-            
-        # Se não tiver coluna de alcance, usa impressões
-        if "reach" not in df.columns:
-            df["reach"] = df["impressions"]
-            
-        # Preenche valores NaN com 0
-        df = df.fillna(0)
-            
         return df
         
     except Exception as e:
@@ -201,14 +95,18 @@ def process_facebook_data(df):
         """)
         return None
 
+@instrumented('chart.evolution')
 def create_evolution_chart(df, metric, title):
     """Cria gráfico de linha com evolução temporal"""
+    import plotly.graph_objects as go
+    data = prepare_line_data(df.rename_axis("date").reset_index(), metric)
+    webgl = use_webgl(len(data))
     fig = go.Figure()
     
-    fig.add_trace(go.Scatter(
-        x=df.index,
-        y=df[metric],
-        mode='lines+markers',
+    fig.add_trace((go.Scattergl if webgl else go.Scatter)(
+        x=data["date"],
+        y=data[metric],
+        mode='lines' if webgl else 'lines+markers',
         name=metric.capitalize(),
         line=dict(
             color='#FF6B6B',
@@ -232,13 +130,6 @@ def create_evolution_chart(df, metric, title):
     )
     return fig
 
-def export_to_excel(df):
-    """Exporta o DataFrame para Excel"""
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Dados', index=False)
-    return output.getvalue()
-
 def main():
     # Inicializa o estado da página se não existir
     if "page" not in st.session_state:
@@ -247,7 +138,7 @@ def main():
     # Sidebar com logo e título
     st.sidebar.markdown("""
         <div class="logo-container">
-            <img src="data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAZAAAABkCAYAAACoy2Z3AAAACXBIWXMAAAsTAAALEwEAmpwYAAAF1WlUWHRYTUw6Y29tLmFkb2JlLnhtcAAAAAAAPD94cGFja2V0IGJlZ2luPSLvu78iIGlkPSJXNU0wTXBDZWhpSHpyZVN6TlRjemtjOWQiPz4gPHg6eG1wbWV0YSB4bWxuczp4PSJhZG9iZTpuczptZXRhLyIgeDp4bXB0az0iQWRvYmUgWE1QIENvcmUgNy4yLWMwMDAgNzkuMWI2NWE3OWI0LCAyMDIyLzA2LzEzLTIyOjAxOjAxICAgICAgICAiPiA8cmRmOlJERiB4bWxuczpyZGY9Imh0dHA6Ly93d3cudzMub3JnLzE5OTkvMDIvMjItcmRmLXN5bnRheC1ucyMiPiA8cmRmOkRlc2NyaXB0aW9uIHJkZjphYm91dD0iIiB4bWxuczp4bXA9Imh0dHA6Ly9ucy5hZG9iZS5jb20veGFwLzEuMC8iIHhtbG5zOnhtcE1NPSJodHRwOi8vbnMuYWRvYmUuY29tL3hhcC8xLjAvbW0vIiB4bWxuczpzdEV2dD0iaHR0cDovL25zLmFkb2JlLmNvbS94YXAvMS4wL3NUeXBlL1Jlc291cmNlRXZlbnQjIiB4bWxuczpkYz0iaHR0cDovL3B1cmwub3JnL2RjL2VsZW1lbnRzLzEuMS8iIHhtbG5zOnBob3Rvc2hvcD0iaHR0cDovL25zLmFkb2JlLmNvbS9waG90b3Nob3AvMS4wLyIgeG1wOkNyZWF0b3JUb29sPSJBZG9iZSBQaG90b3Nob3AgMjQuMCAoV2luZG93cykiIHhtcDpDcmVhdGVEYXRlPSIyMDI0LTAyLTE2VDE2OjI5OjA5LTAzOjAwIiB4bXA6TWV0YWRhdGFEYXRlPSIyMDI0LTAyLTE2VDE2OjI5OjA5LTAzOjAwIiB4bXA6TW9kaWZ5RGF0ZT0iMjAyNC0wMi0xNlQxNjoyOTowOS0wMzowMCIgeG1wTU06SW5zdGFuY2VJRD0ieG1wLmlpZDo2YjY1ZDg4Yy1iNjA4LTRlNGEtODM0ZC1mNzY0NmI1ZjA5MmUiIHhtcE1NOkRvY3VtZW50SUQ9ImFkb2JlOmRvY2lkOnBob3Rvc2hvcDo5ZjVkYzI5MS03ZTZiLWE1NDItOTU3NC0wYzM3NjM2MjI0ZTQiIHhtcE1NOk9yaWdpbmFsRG9jdW1lbnRJRD0ieG1wLmRpZDo2YjY1ZDg4Yy1iNjA4LTRlNGEtODM0ZC1mNzY0NmI1ZjA5MmUiIGRjOmZvcm1hdD0iaW1hZ2UvcG5nIiBwaG90b3Nob3A6Q29sb3JNb2RlPSIzIj4gPHhtcE1NOkhpc3Rvcnk+IDxyZGY6U2VxPiA8cmRmOmxpIHN0RXZ0OmFjdGlvbj0iY3JlYXRlZCIgc3RFdnQ6aW5zdGFuY2VJRD0ieG1wLmlpZDo2YjY1ZDg4Yy1iNjA4LTRlNGEtODM0ZC1mNzY0NmI1ZjA5MmUiIHN0RXZ0OndoZW49IjIwMjQtMDItMTZUMTY6Mjk6MDktMDM6MDAiIHN0RXZ0OnNvZnR3YXJlQWdlbnQ9IkFkb2JlIFBob3Rvc2hvcCAyNC4wIChXaW5kb3dzKSIvPiA8L3JkZjpTZXE+IDwveG1wTU06SGlzdG9yeT4gPC9yZGY6RGVzY3JpcHRpb24+IDwvcmRmOlJERj4gPC94OnhtcG1ldGE+IDw/eHBhY2tldCBlbmQ9InIiPz7ABfj+AAABA0lEQVR42u3BMQEAAADCoPVPbQwfoAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAOA1v9QAATX68/0AAAAASUVORK5CYII=" alt="Logo HubLever">
+            <img src="app/static/logo.png" alt="Logo HubLever">
             <div class="platform-title">Plataforma de Resultados</div>
         </div>
     """, unsafe_allow_html=True)
@@ -265,6 +156,10 @@ def main():
         if st.sidebar.button(f"{icon} {page}", key=f"btn_{page.lower().replace(' ', '_')}"):
             st.session_state.page = page
 
+    # Limpa os caches e atualiza os dias recentes na próxima busca
+    if st.sidebar.button("🔄 Atualizar dados", key="btn_refresh_data"):
+        refresh_data()
+
     # Conteúdo principal
     if st.session_state.page == "Painel de Campanhas":
         st.title(f"🖥️ Painel de Campanhas")
@@ -286,27 +181,215 @@ def main():
         st.title(f"⚙️ Configurações")
         show_settings()
 
+def selected_accounts(platforms):
+    """Contas configuradas das plataformas selecionadas, em formato aceito pelo cache"""
+    return tuple(account for account in configured_accounts() if account[0] in platforms)
+
+@st.fragment
 def show_campaign_dashboard():
+    # Fragmento: mudar um filtro reexecuta só esta página, sem a barra lateral e o CSS
     st.write("Bem-vindo ao Painel de Campanhas!")
-    # Aqui vai o código do dashboard
+    start_date, end_date = create_date_filters()
+    accounts, search = create_drilldown_filters(selected_accounts(create_platform_filter()))
+    
+    # Sincroniza o armazenamento local; os gráficos consultam só os agregados de que precisam
+    sync_store(accounts, start_date, end_date)
+    query = get_query_engine()
+    campaigns = query.campaign_names(start_date, end_date, accounts, search=search) if search else None
+    
+    metrics = load_metrics(accounts, start_date, end_date, campaigns)
+    if metrics is None:
+        st.info("Nenhum dado encontrado para o período selecionado.")
+        return
+    
+    show_kpi_cards(metrics)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        show_platform_comparison(query.aggregate(start_date, end_date, ("platform",), accounts=accounts, search=search))
+    with col2:
+        distribution = query.aggregate(start_date, end_date, ("campaign_name",), accounts=accounts, search=search,
+                                       order_by="spend")
+        st.plotly_chart(create_campaign_distribution(distribution), use_container_width=True)
 
+def show_kpi_cards(metrics):
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Investimento", format_currency(metrics['total_spend']))
+    col2.metric("Impressões", format_number(metrics['total_impressions']))
+    col3.metric("Cliques", format_number(metrics['total_clicks']))
+    col4.metric("Conversões", format_number(metrics['total_conversions']))
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("CTR", format_percentage(metrics['avg_ctr']))
+    col2.metric("CPC", format_currency(metrics['avg_cpc']))
+    col3.metric("CPM", format_currency(metrics['avg_cpm']))
+    col4.metric("CPA", format_currency(metrics['cpa']))
+
+@st.fragment
+def show_platform_comparison(df):
+    # Trocar a métrica redesenha só este gráfico
+    metric = st.selectbox("Métrica da comparação", ["spend", "impressions", "clicks", "conversions", "purchases"],
+                          key="comparison_metric")
+    st.plotly_chart(create_platform_comparison(df, metric), use_container_width=True)
+
+@st.fragment
 def show_daily_evolution():
     st.write("Visualize a evolução diária das suas campanhas")
-    # Código da evolução diária
+    start_date, end_date = create_date_filters()
+    accounts = selected_accounts(create_platform_filter())
+    show_evolution_charts(accounts, start_date, end_date)
+
+@st.fragment
+def show_evolution_charts(accounts, start_date, end_date):
+    # Métrica, granularidade e quebra só afetam os gráficos desta seção
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        metric = st.selectbox("Métrica", ["spend", "impressions", "clicks", "conversions", "purchases"])
+    with col2:
+        granularity = st.radio("Granularidade", ["daily", "hourly"], horizontal=True,
+                               format_func=lambda value: {"daily": "Diária", "hourly": "Por hora"}[value])
+    with col3:
+        breakdown = st.selectbox("Quebra", [None, "device", "placement", "ad_group"],
+                                 format_func=lambda value: BREAKDOWN_LABELS[value])
+    
+    if granularity == "daily" and not breakdown:
+        # Diário sem quebra: somas por dia e plataforma consultadas direto no armazenamento local
+        sync_store(accounts, start_date, end_date)
+        df = get_query_engine().aggregate(start_date, end_date, ("date", "platform"), accounts=accounts)
+    else:
+        df = load_insights(accounts, start_date, end_date,
+                           granularity=granularity, breakdowns=(breakdown,) if breakdown else ())
+    if df.empty:
+        st.info("Nenhum dado encontrado para o período selecionado.")
+        return
+    
+    # As datas ficam em date32 no esquema compacto; os gráficos precisam de datetime
+    df["date"] = pd.to_datetime(df["date"])
+    if granularity == "hourly":
+        df["date"] = df["date"] + pd.to_timedelta(df["hour"], unit="h")
+    
+    evolution = df.groupby("date")[[metric]].sum()
+    st.plotly_chart(create_evolution_chart(evolution, metric, f"Evolução de {metric}"), use_container_width=True)
+    
+    by_platform = df.groupby(["date", "platform"], as_index=False, observed=True)[metric].sum()
+    st.plotly_chart(create_performance_chart(by_platform, metric), use_container_width=True)
+    
+    if breakdown:
+        st.subheader(f"{metric.capitalize()} por {BREAKDOWN_LABELS[breakdown].lower()}")
+        st.dataframe(df.groupby(breakdown, observed=True)[[metric]].sum().sort_values(metric, ascending=False))
 
+@st.fragment
 def show_file_upload():
     st.write("Faça upload dos seus arquivos aqui")
+    platform = st.radio("Plataforma do arquivo", [None, "Facebook", "Google"], horizontal=True,
+                        format_func=lambda value: value or "Detectar automaticamente")
     uploaded_file = st.file_uploader("Selecione um arquivo CSV ou XLSX", type=["csv", "xlsx"])
-    if uploaded_file is not None:
-        st.success("Arquivo carregado com sucesso!")
+    if uploaded_file is None:
+        return
+    
+    # Cada conteúdo é importado uma única vez: o registro de uploads do armazenamento local,
+    # pelo hash do conteúdo, é compartilhado entre sessões e processos (reruns e novos
+    # uploads do mesmo arquivo não o leem de novo)
+    content_hash = file_hash(uploaded_file)
+    progress_bar = st.progress(0.0, text="Importando arquivo...")
+    try:
+        result = ingest_file(
+            uploaded_file,
+            uploaded_file.name,
+            platform,
+            store=get_store(),
+            account_id=f"{UPLOAD_ACCOUNT_PREFIX}{content_hash[:16]}",
+            progress=lambda fraction: progress_bar.progress(fraction, text=f"Importando arquivo... {fraction:.0%}"),
+            content_hash=content_hash
+        )
+    except ValueError as e:
+        progress_bar.empty()
+        st.error(f"⚠️ {str(e)}")
+        return
+    progress_bar.empty()
+    
+    if result['reused']:
+        st.success(f"Arquivo do {result['platform']} já importado anteriormente: {format_number(result['rows'])} linhas.")
+    else:
+        st.success(f"Arquivo do {result['platform']} carregado com sucesso! {format_number(result['rows'])} linhas importadas.")
+    if result['failures']:
+        st.warning(
+            f"⚠️ {sum(result['failures'].values())} célula(s) não puderam ser convertidas: "
+            + ", ".join(f"{column} ({count})" for column, count in result['failures'].items())
+        )
+    st.dataframe(result['data'])
 
+@st.fragment
 def show_export_reports():
     st.write("Exporte seus relatórios personalizados")
-    # Código de exportação
+    start_date, end_date = create_date_filters()
+    accounts = selected_accounts(create_platform_filter())
+    file_format = st.radio("Formato", list(EXPORT_FORMATS), horizontal=True,
+                           format_func=lambda key: EXPORT_FORMATS[key]["label"])
+    st.caption("Para extrações muito grandes prefira CSV compactado ou Parquet: são gerados mais rápido e ocupam menos espaço.")
+    
+    if st.button("Gerar arquivo", key="btn_generate_export"):
+        if not accounts:
+            st.info("Nenhuma conta configurada para as plataformas selecionadas.")
+            return
+        
+        # Garante que os dias do período estejam no armazenamento local antes de exportar
+        sync_store(accounts, start_date, end_date)
+        handle, path = tempfile.mkstemp(suffix=f".{file_format}")
+        os.close(handle)
+        try:
+            with st.spinner("Gerando arquivo..."):
+                rows = export_chunks(iter_store_chunks(get_store(), accounts, start_date, end_date), path, file_format)
+        except Exception as e:
+            os.remove(path)
+            st.error(f"Erro ao gerar o arquivo: {str(e)}")
+            return
+        
+        previous = st.session_state.get("export_file")
+        if previous and os.path.exists(previous["path"]):
+            os.remove(previous["path"])
+        st.session_state.export_file = {
+            "path": path,
+            "name": f"relatorio_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{file_format}",
+            "mime": EXPORT_FORMATS[file_format]["mime"],
+            "rows": rows
+        }
+    
+    export_file = st.session_state.get("export_file")
+    if export_file and os.path.exists(export_file["path"]):
+        st.success(f"{export_file['rows']} linhas exportadas.")
+        with open(export_file["path"], "rb") as file:
+            st.download_button("Baixar arquivo", file, file_name=export_file["name"], mime=export_file["mime"])
 
+@st.fragment
 def show_settings():
     st.write("Configure suas preferências")
     # Código das configurações
+    
+    if st.toggle("Painel de desempenho (depuração)", key="debug_panel"):
+        show_debug_panel()
+
+def show_debug_panel():
+    """Tempo, linhas, bytes, páginas, tentativas e cache por etapa e conta, desde o início do processo"""
+    stats = RECORDER.snapshot()
+    if stats.empty:
+        st.info("Nenhuma etapa medida ainda.")
+        return
+    
+    st.subheader("Totais por etapa")
+    st.dataframe(stats, use_container_width=True, hide_index=True)
+    
+    st.subheader("Execuções recentes")
+    st.dataframe(RECORDER.recent(), use_container_width=True, hide_index=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Baixar métricas (Prometheus)", RECORDER.prometheus_text(),
+                           file_name="ads_dashboard.prom", mime="text/plain")
+    with col2:
+        if st.button("Zerar métricas", key="btn_reset_metrics"):
+            RECORDER.reset()
+            st.rerun(scope="fragment")
 
 if __name__ == "__main__":
     main()
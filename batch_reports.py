@@ -0,0 +1,185 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+import pandas as pd
+from dotenv import load_dotenv
+from fetch_engine import FetchEngine, configured_accounts, fetch_errors
+from report_renderer import build_pdf, render_images
+from snapshots import SNAPSHOT_TTL_SECONDS, SnapshotStore, insights_key
+from utils import calculate_metrics, create_campaign_distribution, create_platform_comparison, export_to_excel
+
+load_dotenv()
+
+OUTPUT_DIR = os.getenv('REPORTS_OUTPUT_DIR', 'reports')
+BATCH_WORKERS = int(os.getenv('REPORTS_BATCH_WORKERS', 8))
+MANIFEST_NAME = 'manifest.json'
+# Alterar quando o layout dos relatórios mudar, para que todos sejam gerados de novo
+REPORT_VERSION = 1
+
+
+def previous_month(today=None):
+    """(início, fim) do mês anterior"""
+    first_day = (today or date.today()).replace(day=1)
+    end = first_day - timedelta(days=1)
+    return end.replace(day=1), end
+
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9_-]+', '-', str(value)).strip('-').lower() or 'cliente'
+
+
+def load_jobs(path, start_date, end_date):
+    """Lê a lista de clientes de um JSON
+
+    Formato: [{"client": "Nome", "accounts": [["Facebook", "act_1"], ["Google", "123"]],
+    "periods": [["2024-01-01", "2024-01-31"]]}]. Sem "periods" usa o período informado.
+    """
+    with open(path, encoding='utf-8') as handle:
+        clients = json.load(handle)
+
+    jobs = []
+    for client in clients:
+        accounts = [tuple(account) for account in client['accounts']]
+        periods = client.get('periods') or [(start_date, end_date)]
+        for period_start, period_end in periods:
+            jobs.append({
+                'client': client['client'],
+                'accounts': accounts,
+                'start_date': pd.Timestamp(period_start).date(),
+                'end_date': pd.Timestamp(period_end).date()
+            })
+    return jobs
+
+
+class BatchReportGenerator:
+    """Gera relatórios Excel e PDF de vários clientes em paralelo, pulando os que não mudaram"""
+
+    def __init__(self, output_dir=None, workers=None, engine=None, snapshots=None):
+        self.output_dir = output_dir or OUTPUT_DIR
+        self.workers = workers or BATCH_WORKERS
+        self.engine = engine or FetchEngine()
+        # Mesmos snapshots do painel: clientes já abertos por alguém não são buscados de novo
+        self.snapshots = snapshots or SnapshotStore()
+        self.manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+        self._lock = threading.Lock()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp"
+        with self._lock:
+            with open(temp_path, 'w', encoding='utf-8') as handle:
+                json.dump(self.manifest, handle, indent=2, sort_keys=True)
+            os.replace(temp_path, self.manifest_path)
+
+    def report_paths(self, job):
+        base = os.path.join(self.output_dir, _slug(job['client']), f"{job['start_date']}_{job['end_date']}")
+        return {'excel': f"{base}.xlsx", 'pdf': f"{base}.pdf"}
+
+    def fingerprint(self, df):
+        """Hash das entradas do relatório: mesmo hash significa relatório idêntico"""
+        digest = hashlib.sha256(str(REPORT_VERSION).encode())
+        if not df.empty:
+            digest.update(','.join(df.columns).encode())
+            digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def _write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as handle:
+            handle.write(content)
+        os.replace(temp_path, path)
+
+    def generate(self, job, force=False):
+        """Gera os relatórios de um cliente/período; retorna 'gerado', 'inalterado' ou 'sem dados'
+
+        Se alguma conta do cliente falhar na busca, o job falha: nada é gerado nem registrado no
+        manifesto, para que a próxima execução tente de novo em vez de considerar o relatório em dia.
+        """
+        key = f"{_slug(job['client'])}/{job['start_date']}_{job['end_date']}"
+        paths = self.report_paths(job)
+
+        df = self.snapshots.get_or_create(
+            insights_key(job['accounts'], job['start_date'], job['end_date']),
+            lambda: self.engine.fetch(job['accounts'], job['start_date'], job['end_date']),
+            max_age=SNAPSHOT_TTL_SECONDS,
+            cacheable=lambda df: not fetch_errors(df)
+        )
+        errors = fetch_errors(df)
+        if errors:
+            failed = ', '.join(f"{account_id} ({platform})" for platform, account_id in errors)
+            raise RuntimeError(f"Falha ao buscar as contas {failed}: {'; '.join(str(e) for e in errors.values())}")
+        if df.empty:
+            return 'sem dados'
+        df = df.sort_values(['account_id', 'platform', 'campaign_name'], ignore_index=True)
+
+        fingerprint = self.fingerprint(df)
+        with self._lock:
+            unchanged = self.manifest.get(key) == fingerprint
+        if unchanged and not force and all(os.path.exists(path) for path in paths.values()):
+            return 'inalterado'
+
+        metrics = calculate_metrics(df)
+        metrics['period'] = f"{job['start_date']:%d/%m/%Y} a {job['end_date']:%d/%m/%Y}"
+        figures = [create_platform_comparison(df, 'spend'), create_campaign_distribution(df)]
+
+        self._write(paths['excel'], export_to_excel(df))
+        self._write(paths['pdf'], build_pdf(metrics, render_images(figures)))
+
+        with self._lock:
+            self.manifest[key] = fingerprint
+        return 'gerado'
+
+    def run(self, jobs, force=False):
+        """Processa todos os jobs; retorna {(cliente, início, fim): status ou mensagem de erro}"""
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(jobs)))) as pool:
+            futures = {pool.submit(self.generate, job, force): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                label = (job['client'], job['start_date'], job['end_date'])
+                try:
+                    results[label] = future.result()
+                except Exception as e:
+                    results[label] = f"erro: {str(e)}"
+                    print(f"Erro ao gerar relatório de {job['client']}: {str(e)}")
+        self._save_manifest()
+        return results
+
+
+if __name__ == '__main__':
+    default_start, default_end = previous_month()
+    parser = argparse.ArgumentParser(description='Gera relatórios Excel e PDF de vários clientes em lote')
+    parser.add_argument('--jobs', help='JSON com clientes, contas e períodos (padrão: contas configuradas no ambiente)')
+    parser.add_argument('--start', default=default_start.isoformat())
+    parser.add_argument('--end', default=default_end.isoformat())
+    parser.add_argument('--output', default=OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS)
+    parser.add_argument('--force', action='store_true', help='Gera de novo mesmo os relatórios inalterados')
+    args = parser.parse_args()
+
+    start_date, end_date = pd.Timestamp(args.start).date(), pd.Timestamp(args.end).date()
+    if args.jobs:
+        jobs = load_jobs(args.jobs, start_date, end_date)
+    else:
+        jobs = [
+            {'client': f"{platform}-{account_id}", 'accounts': [(platform, account_id)], 'start_date': start_date, 'end_date': end_date}
+            for platform, account_id in configured_accounts()
+        ]
+
+    results = BatchReportGenerator(args.output, args.workers).run(jobs, force=args.force)
+    for (client, start, end), status in sorted(results.items(), key=lambda item: str(item[0])):
+        print(f"{client} {start} a {end}: {status}")
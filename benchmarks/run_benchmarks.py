@@ -0,0 +1,400 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from functools import cached_property
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_data import (date_range_for, facebook_api_rows, generate_insights, google_stream_batches,
+                            parse_size, to_export_frame, to_google_csv, write_export)
+from schema import SOURCES
+
+DEFAULT_SIZES = '10k,1m,10m'
+# Acima destes tamanhos a preparação (ou a própria etapa) fica lenta demais para rodar sempre;
+# use --no-limits para incluí-los
+DEFAULT_MAX_ROWS = {
+    'export_to_excel': 1000000,
+    'ingest_file_pt_xlsx': 1000000,
+    'facebook_connector': 1000000,
+    'google_stream_connector': 1000000
+}
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Registra uma etapa: a função recebe os dados sintéticos e devolve o callable medido"""
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+class Datasets:
+    """Dados sintéticos de um tamanho, gerados sob demanda e reaproveitados entre as etapas"""
+
+    def __init__(self, rows, workdir, seed=42):
+        self.rows = rows
+        self.workdir = workdir
+        self.seed = seed
+
+    @cached_property
+    def facebook(self):
+        return generate_insights(self.rows, 'Facebook', self.seed)[0]
+
+    @cached_property
+    def google(self):
+        return generate_insights(self.rows, 'Google', self.seed + 1)[0]
+
+    @cached_property
+    def combined(self):
+        half = self.rows // 2
+        return pd.concat([self.facebook.iloc[:half], self.google.iloc[:self.rows - half]], ignore_index=True)
+
+    @cached_property
+    def period(self):
+        days = int((self.facebook['date'].max() - self.facebook['date'].min()).days) + 1
+        return date_range_for(days)
+
+    def path(self, name):
+        return os.path.join(self.workdir, f"{self.rows}_{name}")
+
+    @cached_property
+    def facebook_pt_csv(self):
+        return write_export(self.facebook, self.path('facebook_pt.csv'), 'facebook_csv_pt')
+
+    @cached_property
+    def facebook_pt_xlsx(self):
+        path = self.path('facebook_pt.xlsx')
+        frame = self.facebook.drop(columns=['platform']).assign(date=self.facebook['date'].dt.date)
+        # Cabeçalho em português e células numéricas, como no export do Gerenciador de Anúncios
+        headers = {canonical: header for header, canonical in reversed(SOURCES['facebook_csv_pt']['columns'].items())}
+        frame.rename(columns=headers).drop(columns=['campaign_id']).to_excel(path, index=False)
+        return path
+
+    @cached_property
+    def facebook_pt_frame(self):
+        # Como o app recebe o export: tudo como texto, antes da conversão de números e datas
+        return to_export_frame(self.facebook, 'facebook_csv_pt')
+
+    @cached_property
+    def facebook_csv(self):
+        return write_export(self.facebook, self.path('facebook.csv'), 'facebook_csv')
+
+    @cached_property
+    def google_csv(self):
+        path = self.path('google.csv')
+        to_google_csv(self.google).to_csv(path, index=False)
+        return path
+
+    @cached_property
+    def facebook_api(self):
+        return facebook_api_rows(self.facebook)
+
+    @cached_property
+    def google_batches(self):
+        return google_stream_batches(self.google)
+
+
+class FakeCursor(list):
+    def total(self):
+        return len(self)
+
+
+class FakeAdAccount:
+    """Conta do Facebook que responde com insights locais, sem rede"""
+
+    def __init__(self, rows, campaigns):
+        self.rows = rows
+        self.campaigns = campaigns
+
+    def get_insights(self, fields=None, params=None, is_async=False):
+        return self.rows
+
+    def get_campaigns(self, fields=None, params=None):
+        return FakeCursor(range(self.campaigns))
+
+
+class FakeGoogleAdsService:
+    def __init__(self, batches):
+        self.batches = batches
+
+    def search_stream(self, customer_id=None, query=None):
+        return iter(self.batches)
+
+
+class FakeGoogleAdsClient:
+    def __init__(self, batches):
+        self.service = FakeGoogleAdsService(batches)
+
+    def get_service(self, name):
+        return self.service
+
+
+def fake_facebook_connector(data, store):
+    from api_connectors import FACEBOOK_ASYNC_CHUNK_DAYS, FacebookAdsConnector
+    connector = FacebookAdsConnector.__new__(FacebookAdsConnector)
+    connector.ad_account_id = 'act_benchmark'
+    connector.api = None
+    connector.account = FakeAdAccount(data.facebook_api, data.facebook['campaign_id'].nunique())
+    connector.store = store
+    # Sempre o relatório síncrono: o assíncrono depende do tempo de processamento do Facebook
+    connector.async_row_threshold = float('inf')
+    connector.async_chunk_days = FACEBOOK_ASYNC_CHUNK_DAYS
+    return connector
+
+
+def fake_google_connector(data, store):
+    from api_connectors import GoogleAdsConnector
+    connector = GoogleAdsConnector.__new__(GoogleAdsConnector)
+    connector.client = FakeGoogleAdsClient(data.google_batches)
+    connector.customer_id = '1234567890'
+    connector.transport_name = 'Google:1234567890'
+    connector.store = store
+    connector.use_stream = True
+    return connector
+
+
+def _store(data, name):
+    from data_store import InsightsStore
+    path = data.path(f"{name}.db")
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return InsightsStore(path)
+
+
+@benchmark('process_facebook_data')
+def _process_facebook_data(data):
+    from app import process_facebook_data
+    frame = data.facebook_pt_frame
+    return lambda: process_facebook_data(frame.copy())
+
+
+@benchmark('process_facebook_csv')
+def _process_facebook_csv(data):
+    from api_connectors import process_facebook_csv
+    path = data.facebook_csv
+    return lambda: process_facebook_csv(path)
+
+
+@benchmark('process_google_csv')
+def _process_google_csv(data):
+    from api_connectors import process_google_csv
+    path = data.google_csv
+    return lambda: process_google_csv(path)
+
+
+@benchmark('ingest_file_pt_csv')
+def _ingest_file(data):
+    from ingestion import ingest_file
+    path = data.facebook_pt_csv
+    return lambda: ingest_file(path, path, 'Facebook', store=_store(data, 'ingestion'), account_id='benchmark', reuse=False)
+
+
+@benchmark('ingest_file_pt_xlsx')
+def _ingest_file_xlsx(data):
+    from ingestion import ingest_file
+    path = data.facebook_pt_xlsx
+    # Sem plataforma: a origem é detectada pelo cabeçalho
+    return lambda: ingest_file(path, path, store=_store(data, 'ingestion'), account_id='benchmark', reuse=False)
+
+
+@benchmark('calculate_metrics')
+def _calculate_metrics(data):
+    from utils import calculate_metrics
+    df = data.combined
+    return lambda: calculate_metrics(df)
+
+
+@benchmark('create_performance_chart')
+def _create_performance_chart(data):
+    from utils import create_performance_chart
+    df = data.combined
+    return lambda: create_performance_chart(df, 'spend').to_json()
+
+
+@benchmark('create_platform_comparison')
+def _create_platform_comparison(data):
+    from utils import create_platform_comparison
+    df = data.combined
+    return lambda: create_platform_comparison(df, 'spend').to_json()
+
+
+@benchmark('create_campaign_distribution')
+def _create_campaign_distribution(data):
+    from utils import create_campaign_distribution
+    df = data.combined
+    return lambda: create_campaign_distribution(df).to_json()
+
+
+@benchmark('export_to_excel')
+def _export_to_excel(data):
+    from utils import export_to_excel
+    df = data.combined
+    return lambda: export_to_excel(df)
+
+
+@benchmark('export_to_pdf')
+def _export_to_pdf(data):
+    from utils import calculate_metrics, create_campaign_distribution, create_performance_chart, create_platform_comparison, export_to_pdf
+    df = data.combined
+    metrics = dict(calculate_metrics(df), period='benchmark')
+
+    def run():
+        figures = [create_performance_chart(df, 'spend'), create_platform_comparison(df, 'spend'), create_campaign_distribution(df)]
+        return export_to_pdf(figures, metrics)
+    return run
+
+
+@benchmark('facebook_connector')
+def _facebook_connector(data):
+    start, end = data.period
+    connector = fake_facebook_connector(data, _store(data, 'facebook'))
+    return lambda: connector.fetch_daily_data(start, end)
+
+
+@benchmark('google_stream_connector')
+def _google_stream_connector(data):
+    from api_connectors import _collect
+    start, end = data.period
+    connector = fake_google_connector(data, _store(data, 'google'))
+    return lambda: _collect(connector.fetch_daily_data(start, end))
+
+
+def measure(func, repeat, memory=False):
+    """Tempos de cada execução (s), pico de memória alocada (MB, opcional) e o último resultado"""
+    times = []
+    peak = None
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        if memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+        if memory:
+            peak = max(peak or 0, tracemalloc.get_traced_memory()[1] / 1024 ** 2)
+            tracemalloc.stop()
+    return times, peak, result
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__
+    }
+
+
+def run_benchmarks(sizes, names=None, repeat=3, memory=False, limits=True, workdir=None):
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as directory:
+        for rows in sizes:
+            data = Datasets(rows, directory)
+            for name, setup in BENCHMARKS.items():
+                if names and name not in names:
+                    continue
+                if limits and rows > DEFAULT_MAX_ROWS.get(name, rows):
+                    continue
+                result = {'benchmark': name, 'rows': rows}
+                try:
+                    times, peak, output = measure(setup(data), repeat, memory)
+                    if isinstance(output, pd.DataFrame):
+                        # Algumas funções só registram o erro e devolvem um DataFrame vazio
+                        result['output_rows'] = len(output)
+                    elif isinstance(output, (bytes, str)):
+                        result['output_bytes'] = len(output)
+                    result.update({
+                        'best_seconds': min(times),
+                        'mean_seconds': sum(times) / len(times),
+                        'runs': times,
+                        'rows_per_second': rows / min(times) if min(times) else None
+                    })
+                    if peak is not None:
+                        result['peak_memory_mb'] = peak
+                except Exception as e:
+                    result['error'] = f"{type(e).__name__}: {str(e)}"
+                results.append(result)
+                print(f"{name:<30} {rows:>10} linhas  "
+                      + (f"{result['best_seconds']:.3f}s" if 'best_seconds' in result else result['error']),
+                      file=sys.stderr)
+    return {'environment': environment(), 'results': results}
+
+
+def compare(current, baseline, threshold):
+    """Compara com um resultado anterior; retorna as etapas que ficaram mais lentas que o limite"""
+    previous = {(item['benchmark'], item['rows']): item for item in baseline['results'] if 'best_seconds' in item}
+    regressions = []
+    for item in current['results']:
+        before = previous.get((item['benchmark'], item['rows']))
+        if before is None or 'best_seconds' not in item:
+            continue
+        ratio = item['best_seconds'] / before['best_seconds'] if before['best_seconds'] else 1
+        item['baseline_seconds'] = before['best_seconds']
+        item['ratio'] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(item)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mede as etapas críticas do dashboard com dados sintéticos')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Tamanhos separados por vírgula (ex.: 10k,1m,10m)')
+    parser.add_argument('--only', help='Etapas separadas por vírgula; padrão: todas')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--memory', action='store_true', help='Mede o pico de memória com tracemalloc (mais lento)')
+    parser.add_argument('--no-limits', action='store_true', help='Roda também as etapas acima dos tamanhos padrão')
+    parser.add_argument('--output', help='Arquivo JSON de saída; padrão: stdout')
+    parser.add_argument('--compare', help='JSON de uma execução anterior para comparação')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Piora tolerada na comparação (0.1 = 10%%)')
+    parser.add_argument('--list', action='store_true', help='Lista as etapas disponíveis')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+        sys.exit(0)
+
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    names = [name.strip() for name in args.only.split(',')] if args.only else None
+    report = run_benchmarks(sizes, names, args.repeat, args.memory, limits=not args.no_limits)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            regressions = compare(report, json.load(handle), args.threshold)
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(output)
+    else:
+        print(output)
+
+    for item in regressions:
+        print(f"Regressão: {item['benchmark']} ({item['rows']} linhas) {item['baseline_seconds']:.3f}s -> "
+              f"{item['best_seconds']:.3f}s ({item['ratio']:.2f}x)", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
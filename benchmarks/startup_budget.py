@@ -0,0 +1,79 @@
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SDKS = ('facebook_business', 'google.ads', 'grpc')
+UI = ('streamlit', 'plotly')
+
+# Módulo de entrada: (tempo máximo de importação em ms, pacotes que não podem ser carregados)
+# Processos que só tratam CSV, exportam ou geram relatórios não devem importar os SDKs das plataformas
+ENTRY_POINTS = {
+    'ingestion': (1500, SDKS + UI + ('openpyxl',)),
+    'exporters': (1500, SDKS + UI + ('openpyxl',)),
+    'api_connectors': (1500, SDKS + UI + ('openpyxl',)),
+    'fetch_engine': (1500, SDKS + UI + ('openpyxl',)),
+    'prefetch': (1500, SDKS + UI + ('openpyxl',)),
+    'api_server': (1500, SDKS + UI + ('openpyxl',)),
+    'utils': (1500, SDKS + UI + ('openpyxl',)),
+    'batch_reports': (2500, SDKS + ('streamlit', 'openpyxl'))
+}
+
+
+def import_profile(module):
+    """Tempo cumulativo de importação (ms) e módulos carregados, via `python -X importtime`"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    loaded = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        name = name.strip()
+        if cumulative.strip().isdigit():
+            loaded[name] = int(cumulative) / 1000
+    return loaded.get(module, 0.0), set(loaded)
+
+
+def forbidden_imports(loaded, forbidden):
+    return sorted(name for name in loaded if any(name == package or name.startswith(package + '.') for package in forbidden))
+
+
+def check_startup(modules=None, repeat=3, scale=1.0):
+    """Mede cada módulo de entrada (melhor de `repeat` processos novos) e retorna as violações"""
+    violations = []
+    for module, (budget, forbidden) in ENTRY_POINTS.items():
+        if modules and module not in modules:
+            continue
+        profiles = [import_profile(module) for _ in range(repeat)]
+        elapsed = min(seconds for seconds, _ in profiles)
+        unexpected = forbidden_imports(profiles[0][1], forbidden)
+        budget *= scale
+        status = 'ok' if elapsed <= budget and not unexpected else 'FALHOU'
+        print(f"{module:<20} {elapsed:>8.0f} ms  (limite {budget:.0f} ms)  {status}")
+        if elapsed > budget:
+            violations.append(f"{module}: {elapsed:.0f} ms acima do limite de {budget:.0f} ms")
+        if unexpected:
+            # Mostra só os pacotes de topo para não listar centenas de submódulos
+            packages = sorted({next(package for package in forbidden if name == package or name.startswith(package + '.'))
+                               for name in unexpected})
+            violations.append(f"{module}: importa {', '.join(packages)} na inicialização")
+    return violations
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Verifica o tempo de importação e as importações pesadas dos módulos de entrada')
+    parser.add_argument('--only', help='Módulos separados por vírgula; padrão: todos')
+    parser.add_argument('--repeat', type=int, default=3, help='Processos por módulo (vale o mais rápido)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplica os limites (ex.: 2 em máquinas lentas)')
+    args = parser.parse_args()
+
+    modules = [module.strip() for module in args.only.split(',')] if args.only else None
+    violations = check_startup(modules, args.repeat, args.scale)
+    for violation in violations:
+        print(violation, file=sys.stderr)
+    sys.exit(1 if violations else 0)
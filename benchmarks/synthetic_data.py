@@ -0,0 +1,177 @@
+import os
+import sys
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema import SOURCES
+
+# Campanhas por conta crescem com o volume, mas bem mais devagar que as linhas
+MIN_CAMPAIGNS = 20
+MAX_CAMPAIGNS = 5000
+
+
+def parse_size(value):
+    """'10k' -> 10000, '1m' -> 1000000, '250000' -> 250000"""
+    value = str(value).strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+
+def generate_insights(rows, platform='Facebook', seed=42, start=None):
+    """Insights diários sintéticos no esquema canônico (uma linha por campanha x dia)
+
+    Gasto com distribuição log-normal, CPM e CTR variando por campanha e cliques/conversões
+    sorteados a partir das taxas, como nos relatórios reais.
+    """
+    rng = np.random.default_rng(seed)
+    campaigns = int(np.clip(np.sqrt(rows) * 2, MIN_CAMPAIGNS, MAX_CAMPAIGNS))
+    days = max(1, -(-rows // campaigns))
+    start = start or date(2024, 1, 1)
+
+    campaign_index = np.arange(rows) % campaigns
+    day_index = np.arange(rows) // campaigns
+    campaign_cpm = rng.uniform(8, 60, campaigns)
+    campaign_ctr = rng.uniform(0.004, 0.04, campaigns)
+
+    spend = np.round(rng.lognormal(4, 1.2, rows), 2)
+    impressions = np.maximum((spend / campaign_cpm[campaign_index] * 1000).astype('int64'), 1)
+    clicks = rng.binomial(impressions, campaign_ctr[campaign_index])
+    conversions = rng.binomial(clicks, 0.05)
+    reach = (impressions * rng.uniform(0.6, 0.95, rows)).astype('int64')
+
+    dates = pd.to_datetime(start) + pd.to_timedelta(day_index, unit='D')
+    prefix = 'FB' if platform == 'Facebook' else 'GA'
+    df = pd.DataFrame({
+        'platform': platform,
+        'date': dates,
+        'campaign_id': (campaign_index + 1000).astype(str),
+        'campaign_name': pd.Categorical.from_codes(campaign_index, [f"{prefix} Campanha {i:04d}" for i in range(campaigns)]),
+        'spend': spend,
+        'impressions': impressions,
+        'clicks': clicks,
+        'conversions': conversions.astype('float64'),
+        'reach': reach
+    })
+    df['ctr'] = np.where(impressions > 0, clicks / impressions * 100, 0)
+    df['cpc'] = np.where(clicks > 0, spend / np.maximum(clicks, 1), 0)
+    df['cpm'] = spend / impressions * 1000
+    return df, days
+
+
+def _headers(source):
+    """Cabeçalho de origem para cada coluna canônica (o primeiro nome do mapeamento)"""
+    headers = {}
+    for header, canonical in SOURCES[source]['columns'].items():
+        headers.setdefault(canonical, header)
+    return headers
+
+
+def _format_numbers(values, decimals, decimal):
+    text = pd.Series(values).map(f"{{:,.{decimals}f}}".format)
+    if decimal == ',':
+        text = text.str.translate(str.maketrans({',': '.', '.': ','}))
+    return text
+
+
+def to_export_frame(df, source):
+    """Converte insights canônicos no layout (e na formatação numérica) de um export de arquivo"""
+    spec = SOURCES[source]
+    decimal = spec['decimal']
+    headers = _headers(source)
+    if source == 'facebook_csv':
+        # Layout simplificado: nomes canônicos e ponto decimal
+        return df.drop(columns=['platform']).assign(date=df['date'].dt.strftime('%Y-%m-%d'))
+
+    out = pd.DataFrame({
+        headers['campaign_name']: df['campaign_name'].astype(str),
+        headers['date']: df['date'].dt.strftime('%d/%m/%Y' if decimal == ',' else '%Y-%m-%d')
+    })
+    for column, decimals in [('spend', 2), ('impressions', 0), ('clicks', 0), ('ctr', 2), ('cpc', 2), ('cpm', 2),
+                             ('reach', 0), ('conversions', 0)]:
+        if column in headers:
+            out[headers[column]] = _format_numbers(df[column].to_numpy(), decimals, decimal)
+    return out
+
+
+def write_export(df, path, source):
+    """Grava o export no formato da origem: ';' como separador nos exports em português"""
+    out = to_export_frame(df, source)
+    separator = ';' if SOURCES[source]['decimal'] == ',' else ','
+    out.to_csv(path, index=False, sep=separator, encoding='utf-8')
+    return path
+
+
+def to_google_csv(df):
+    """Layout simplificado aceito por process_google_csv (cost, avg_cpc, avg_cpm)"""
+    out = df.drop(columns=['platform']).assign(date=df['date'].dt.strftime('%Y-%m-%d'))
+    return out.rename(columns={'spend': 'cost', 'cpc': 'avg_cpc', 'cpm': 'avg_cpm'})
+
+
+def facebook_api_rows(df):
+    """Respostas da API de insights do Facebook (valores como texto, como no JSON original)"""
+    records = pd.DataFrame({
+        'date_start': df['date'].dt.strftime('%Y-%m-%d'),
+        'campaign_id': df['campaign_id'],
+        'campaign_name': df['campaign_name'].astype(str),
+        'spend': df['spend'].map('{:.2f}'.format),
+        'impressions': df['impressions'].astype(str),
+        'clicks': df['clicks'].astype(str),
+        'ctr': df['ctr'].map('{:.4f}'.format),
+        'cpc': df['cpc'].map('{:.4f}'.format),
+        'cpm': df['cpm'].map('{:.4f}'.format),
+        'reach': df['reach'].astype(str)
+    }).to_dict('records')
+    clicks = df['clicks'].to_numpy()
+    # Visualizações de vídeo como fração das impressões, caindo a cada quartil assistido
+    watched = {
+        f"video_p{quartile}_watched_actions": (df['impressions'].to_numpy() * share).astype('int64')
+        for quartile, share in ((25, 0.3), (50, 0.18), (75, 0.1), (100, 0.05))
+    }
+    for position, (record, conversions) in enumerate(zip(records, df['conversions'].to_numpy())):
+        record['actions'] = [{'action_type': 'link_click', 'value': str(int(clicks[position]))}]
+        if conversions:
+            record['actions'].append({'action_type': 'lead', 'value': str(int(conversions))})
+        for field, values in watched.items():
+            if values[position]:
+                record[field] = [{'action_type': 'video_view', 'value': str(int(values[position]))}]
+    return records
+
+
+def google_stream_batches(df, batch_size=10000):
+    """Lotes do search_stream do Google Ads montados direto nas mensagens protobuf"""
+    from google.ads.googleads.v15.services.types.google_ads_service import SearchGoogleAdsStreamResponse
+
+    dates = df['date'].dt.strftime('%Y-%m-%d').to_numpy()
+    names = df['campaign_name'].astype(str).to_numpy()
+    ids = df['campaign_id'].astype('int64').to_numpy()
+    cost = (df['spend'].to_numpy() * 1000000).astype('int64')
+    cpc = (df['cpc'].to_numpy() * 1000000).astype('float64')
+    cpm = (df['cpm'].to_numpy() * 1000000).astype('float64')
+    impressions, clicks = df['impressions'].to_numpy(), df['clicks'].to_numpy()
+    ctr, conversions = df['ctr'].to_numpy() / 100, df['conversions'].to_numpy()
+
+    batches = []
+    for start in range(0, len(df), batch_size):
+        message = SearchGoogleAdsStreamResponse.pb()()
+        for i in range(start, min(start + batch_size, len(df))):
+            row = message.results.add()
+            row.segments.date = dates[i]
+            row.campaign.id = int(ids[i])
+            row.campaign.name = names[i]
+            row.metrics.cost_micros = int(cost[i])
+            row.metrics.impressions = int(impressions[i])
+            row.metrics.clicks = int(clicks[i])
+            row.metrics.ctr = float(ctr[i])
+            row.metrics.average_cpc = float(cpc[i])
+            row.metrics.average_cpm = float(cpm[i])
+            row.metrics.conversions = float(conversions[i])
+        batches.append(SearchGoogleAdsStreamResponse.wrap(message))
+    return batches
+
+
+def date_range_for(days, start=None):
+    start = start or date(2024, 1, 1)
+    return start, start + timedelta(days=days - 1)
@@ -0,0 +1,118 @@
+import os
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Limite de baldes de tempo por série após a reamostragem
+RESAMPLE_MAX_BUCKETS = int(os.getenv('CHART_RESAMPLE_MAX_BUCKETS', 2000))
+# Pontos por série enviados ao navegador depois do LTTB
+LINE_MAX_POINTS = int(os.getenv('CHART_LINE_MAX_POINTS', 500))
+# A partir deste total de pontos os gráficos de linha usam WebGL (Scattergl)
+WEBGL_THRESHOLD = int(os.getenv('CHART_WEBGL_THRESHOLD', 1000))
+# Fatias do gráfico de pizza; o restante das campanhas vira "Outras"
+PIE_MAX_SLICES = int(os.getenv('CHART_PIE_MAX_SLICES', 10))
+OTHERS_LABEL = 'Outras'
+
+# Baldes de tempo em ordem crescente: (frequência, duração aproximada)
+TIME_BUCKETS = [
+    ('h', pd.Timedelta(hours=1)),
+    ('3h', pd.Timedelta(hours=3)),
+    ('6h', pd.Timedelta(hours=6)),
+    ('12h', pd.Timedelta(hours=12)),
+    ('D', pd.Timedelta(days=1)),
+    ('W', pd.Timedelta(weeks=1)),
+    ('M', pd.Timedelta(days=31))
+]
+
+
+def choose_bucket(start, end, max_buckets=None):
+    """Menor balde de tempo que cobre o intervalo visível com no máximo `max_buckets` pontos"""
+    max_buckets = max_buckets or RESAMPLE_MAX_BUCKETS
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    for freq, size in TIME_BUCKETS:
+        if span / size < max_buckets:
+            return freq
+    return TIME_BUCKETS[-1][0]
+
+
+def bucket_dates(dates, freq):
+    """Início do balde de cada data"""
+    dates = pd.to_datetime(dates)
+    if freq in ('W', 'M'):
+        return dates.dt.to_period(freq).dt.start_time
+    return dates.dt.floor(freq)
+
+
+def lttb(x, y, threshold):
+    """Índices dos pontos escolhidos pelo Largest-Triangle-Three-Buckets
+
+    Mantém o primeiro e o último ponto e, em cada balde intermediário, o ponto que forma o
+    maior triângulo com o ponto escolhido antes e a média do balde seguinte. Preserva picos
+    e vales que uma média simples apagaria.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = edges[bucket + 1], edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        next_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def prepare_line_data(df, metric, by=None, date_column='date', max_points=None):
+    """Reamostra a métrica (aditiva) para um balde adaptativo e reduz cada série com LTTB
+
+    Retorna um DataFrame com `date_column`, `metric` e, se informado, a coluna `by`.
+    """
+    max_points = max_points or LINE_MAX_POINTS
+    columns = [date_column] + ([by] if by else [])
+    if df.empty:
+        return pd.DataFrame(columns=columns + [metric])
+
+    dates = pd.to_datetime(df[date_column])
+    freq = choose_bucket(dates.min(), dates.max())
+    data = df[[metric] + ([by] if by else [])].assign(**{date_column: bucket_dates(dates, freq)})
+    data = data.groupby(columns, as_index=False, observed=True, sort=True)[metric].sum()
+
+    series = [group for _, group in data.groupby(by, observed=True, sort=False)] if by else [data]
+    reduced = []
+    for group in series:
+        if len(group) > max_points:
+            indices = lttb(group[date_column].to_numpy().astype('datetime64[s]').astype('int64'), group[metric].to_numpy(), max_points)
+            group = group.iloc[indices]
+        reduced.append(group)
+    return pd.concat(reduced, ignore_index=True)
+
+
+def fold_long_tail(df, label_column, value_column, max_slices=None):
+    """Mantém as maiores fatias e soma o restante em "Outras" """
+    max_slices = max_slices or PIE_MAX_SLICES
+    totals = df.groupby(label_column, observed=True)[value_column].sum().sort_values(ascending=False)
+    totals.index = totals.index.astype(str)
+    if len(totals) > max_slices:
+        others = totals.iloc[max_slices - 1:].sum()
+        totals = totals.iloc[:max_slices - 1]
+        totals[OTHERS_LABEL] = others
+    return totals.rename_axis(label_column).reset_index()
+
+
+def use_webgl(points):
+    return points > WEBGL_THRESHOLD
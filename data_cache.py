@@ -0,0 +1,89 @@
+import streamlit as st
+from data_store import InsightsStore
+from fetch_engine import FetchEngine, fetch_errors
+from metrics_engine import MetricsCube
+from query_engine import InsightsQuery
+from snapshots import SNAPSHOT_TTL_SECONDS, SnapshotStore, insights_key
+
+
+@st.cache_resource
+def get_store():
+    """Armazenamento local compartilhado entre sessões"""
+    return InsightsStore()
+
+
+@st.cache_resource
+def get_fetch_engine():
+    """Motor de busca compartilhado; mantém os clientes das APIs já inicializados por conta"""
+    return FetchEngine(store=get_store())
+
+
+def get_connector(platform, account_id):
+    """Conector da conta, criado uma única vez por processo"""
+    return get_fetch_engine().connector(platform, account_id)
+
+
+@st.cache_resource
+def get_snapshots():
+    """Snapshots Arrow mapeados em memória, compartilhados entre sessões e com os relatórios em lote"""
+    return SnapshotStore()
+
+
+def sync_store(accounts, start_date, end_date):
+    """Garante que os dias do período estejam no armazenamento local, sem carregar os dados
+
+    Contas que falharem ficam com os dias já armazenados, com um aviso na página.
+    """
+    with st.spinner("Sincronizando dados das plataformas..."):
+        errors = get_fetch_engine().sync(list(accounts), start_date, end_date)
+    for (platform, account_id), error in errors.items():
+        st.warning(f"Não foi possível atualizar a conta {account_id} ({platform}); exibindo os dados já armazenados. {str(error)}")
+
+
+def load_insights(accounts, start_date, end_date, granularity=None, breakdowns=()):
+    """Dados das contas no período; `accounts` é uma sequência de (plataforma, id da conta)
+
+    Cada combinação de contas, período e quebras é buscada uma vez e servida a todas as
+    sessões a partir do mesmo snapshot, sem uma cópia dos dados por sessão. Resultados com
+    contas que falharam não viram snapshot (a próxima chamada tenta de novo) e são exibidos
+    com um aviso por conta.
+    """
+    def build():
+        with st.spinner("Buscando dados das plataformas..."):
+            return get_fetch_engine().fetch(list(accounts), start_date, end_date, granularity, tuple(breakdowns))
+
+    name = insights_key(accounts, start_date, end_date, granularity, breakdowns)
+    df = get_snapshots().get_or_create(name, build, max_age=SNAPSHOT_TTL_SECONDS,
+                                       cacheable=lambda df: not fetch_errors(df))
+    for (platform, account_id), error in fetch_errors(df).items():
+        st.warning(f"Não foi possível buscar os dados da conta {account_id} ({platform}); os resultados exibidos estão incompletos. {str(error)}")
+    return df
+
+
+@st.cache_resource
+def get_metrics_cube():
+    """Cubo de agregados diários compartilhado entre sessões, atualizado a partir do armazenamento local"""
+    return MetricsCube()
+
+
+def load_metrics(accounts, start_date, end_date, campaigns=None):
+    """KPIs consolidados das contas no período, calculados a partir do cubo de agregados
+
+    Lê o armazenamento local: sincronize antes o período com `sync_store`.
+    """
+    cube = get_metrics_cube()
+    for platform, account_id in accounts:
+        cube.sync_from_store(get_store(), platform, account_id, start_date, end_date)
+    return cube.metrics(accounts, start_date, end_date, campaigns)
+
+
+@st.cache_resource
+def get_query_engine():
+    """Consultas agregadas (com filtros no SQLite) sobre o armazenamento local compartilhado"""
+    return InsightsQuery(get_store())
+
+
+def refresh_data():
+    """Descarta os dados em cache e força a atualização dos dias recentes na próxima busca"""
+    get_store().invalidate_recent()
+    get_snapshots().clear()
@@ -0,0 +1,432 @@
+import json
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+import pandas as pd
+from dotenv import load_dotenv
+from instrumentation import count, timed
+from schema import compact
+
+load_dotenv()
+
+DEFAULT_DB_PATH = os.getenv('INSIGHTS_DB_PATH', os.path.join('data', 'insights.db'))
+# Dias finais do período que ainda podem ser revisados pelas plataformas (conversões atrasadas etc.)
+SETTLING_DAYS = int(os.getenv('INSIGHTS_SETTLING_DAYS', 3))
+# Intervalo mínimo entre duas buscas de um mesmo dia ainda em consolidação
+REFRESH_MINUTES = int(os.getenv('INSIGHTS_REFRESH_MINUTES', 60))
+# Prefixo das contas fictícias em que os arquivos importados são gravados
+UPLOAD_ACCOUNT_PREFIX = 'upload-'
+
+INSIGHT_COLUMNS = [
+    'date',
+    'campaign_id',
+    'campaign_name',
+    'spend',
+    'impressions',
+    'clicks',
+    'conversions',
+    'reach',
+    'purchases',
+    'video_p25',
+    'video_p50',
+    'video_p75',
+    'video_p100'
+]
+# Métricas aditivas gravadas por linha (e somadas em daily_totals); as demais são contagens inteiras
+METRICS = INSIGHT_COLUMNS[3:]
+REAL_METRICS = ['spend', 'conversions', 'purchases']
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS insights (
+        platform TEXT NOT NULL,
+        account_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        campaign_id TEXT NOT NULL,
+        campaign_name TEXT,
+        spend REAL DEFAULT 0,
+        impressions INTEGER DEFAULT 0,
+        clicks INTEGER DEFAULT 0,
+        conversions REAL DEFAULT 0,
+        reach INTEGER DEFAULT 0,
+        purchases REAL DEFAULT 0,
+        video_p25 INTEGER DEFAULT 0,
+        video_p50 INTEGER DEFAULT 0,
+        video_p75 INTEGER DEFAULT 0,
+        video_p100 INTEGER DEFAULT 0,
+        PRIMARY KEY (platform, account_id, date, campaign_id)
+    );
+    -- Somas por conta e dia, mantidas junto com insights: consultas sem campanha leem daqui
+    CREATE TABLE IF NOT EXISTS daily_totals (
+        platform TEXT NOT NULL,
+        account_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        spend REAL DEFAULT 0,
+        impressions INTEGER DEFAULT 0,
+        clicks INTEGER DEFAULT 0,
+        conversions REAL DEFAULT 0,
+        reach INTEGER DEFAULT 0,
+        purchases REAL DEFAULT 0,
+        video_p25 INTEGER DEFAULT 0,
+        video_p50 INTEGER DEFAULT 0,
+        video_p75 INTEGER DEFAULT 0,
+        video_p100 INTEGER DEFAULT 0,
+        PRIMARY KEY (platform, account_id, date)
+    );
+    CREATE TABLE IF NOT EXISTS synced_days (
+        platform TEXT NOT NULL,
+        account_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        fetched_at TEXT NOT NULL,
+        PRIMARY KEY (platform, account_id, date)
+    );
+    -- Arquivos importados, pelo hash do conteúdo: um novo upload igual é servido daqui, com o
+    -- consolidado por campanha (summary). Arquivos sem data não têm conta nem período
+    CREATE TABLE IF NOT EXISTS uploads (
+        content_hash TEXT PRIMARY KEY,
+        platform TEXT NOT NULL,
+        account_id TEXT,
+        source TEXT NOT NULL,
+        rows INTEGER NOT NULL,
+        failures TEXT NOT NULL,
+        start_date TEXT,
+        end_date TEXT,
+        summary TEXT NOT NULL,
+        imported_at TEXT NOT NULL
+    );
+"""
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def _date_range(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
+
+# Trechos de SQL montados a partir das colunas armazenadas
+_INSERT_COLUMNS = ', '.join(['platform', 'account_id'] + INSIGHT_COLUMNS)
+_INSERT_VALUES = ', '.join('?' for _ in range(len(INSIGHT_COLUMNS) + 2))
+_METRIC_LIST = ', '.join(METRICS)
+_METRIC_SUMS = ', '.join(f"SUM({column})" for column in METRICS)
+
+
+def _add_missing_columns(conn, table):
+    """Bancos criados antes das métricas de compras e vídeo: adiciona as colunas que faltam"""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for column in METRICS:
+        if column not in existing:
+            sql_type = 'REAL' if column in REAL_METRICS else 'INTEGER'
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type} DEFAULT 0")
+
+
+def _refresh_daily_totals(conn, platform, account_id, start_date, end_date):
+    """Recalcula as somas diárias da conta no intervalo a partir da tabela insights"""
+    params = (platform, str(account_id), start_date.isoformat(), end_date.isoformat())
+    conn.execute("DELETE FROM daily_totals WHERE platform = ? AND account_id = ? AND date BETWEEN ? AND ?", params)
+    conn.execute(
+        f"""
+        INSERT INTO daily_totals (platform, account_id, date, {_METRIC_LIST})
+        SELECT platform, account_id, date, {_METRIC_SUMS}
+        FROM insights
+        WHERE platform = ? AND account_id = ? AND date BETWEEN ? AND ?
+        GROUP BY platform, account_id, date
+        """,
+        params
+    )
+
+
+def _delete_account(conn, platform, account_id):
+    """Remove os dados da conta de todas as tabelas, na transação de `conn`"""
+    for table in ('insights', 'daily_totals', 'synced_days', 'uploads'):
+        conn.execute(f"DELETE FROM {table} WHERE platform = ? AND account_id = ?", (platform, str(account_id)))
+
+
+def _insight_rows(platform, account_id, df):
+    """Tuplas prontas para inserção na tabela insights"""
+    rows = df.reindex(columns=INSIGHT_COLUMNS).copy()
+    rows['date'] = pd.to_datetime(rows['date']).dt.strftime('%Y-%m-%d')
+    rows['campaign_id'] = rows['campaign_id'].astype(object).fillna(rows['campaign_name'].astype(object)).astype(str)
+    rows['campaign_name'] = rows['campaign_name'].astype(object)
+    counts = [column for column in METRICS if column not in REAL_METRICS]
+    rows[REAL_METRICS] = rows[REAL_METRICS].fillna(0).astype(float)
+    rows[counts] = rows[counts].fillna(0).astype('int64')
+    return ((platform, account_id, *row) for row in rows.itertuples(index=False, name=None))
+
+
+class InsightsStore:
+    """Armazenamento local (SQLite) dos insights diários por plataforma, conta e dia"""
+
+    def __init__(self, db_path=None, settling_days=None, refresh_minutes=None):
+        self.db_path = db_path or DEFAULT_DB_PATH
+        self.settling_days = SETTLING_DAYS if settling_days is None else settling_days
+        self.refresh_minutes = REFRESH_MINUTES if refresh_minutes is None else refresh_minutes
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            _add_missing_columns(conn, 'insights')
+            _add_missing_columns(conn, 'daily_totals')
+            # Índice de uploads anterior ao consolidado por campanha: só serve para reaproveitar
+            # importações, então é recriado vazio (o próximo upload de cada arquivo é lido de novo)
+            if 'summary' not in {row[1] for row in conn.execute("PRAGMA table_info(uploads)")}:
+                conn.execute("DROP TABLE uploads")
+                conn.executescript(SCHEMA)
+            # Bancos criados antes de daily_totals: preenche uma única vez
+            if conn.execute("SELECT 1 FROM daily_totals LIMIT 1").fetchone() is None:
+                conn.execute(
+                    f"""
+                    INSERT INTO daily_totals (platform, account_id, date, {_METRIC_LIST})
+                    SELECT platform, account_id, date, {_METRIC_SUMS}
+                    FROM insights
+                    GROUP BY platform, account_id, date
+                    """
+                )
+
+    def _connect(self):
+        # Uma conexão por operação: permite uso seguro a partir de várias threads
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _needs_refresh(self, day, fetched_at, now):
+        """Um dia precisa ser buscado se nunca foi sincronizado ou se ainda estava em consolidação"""
+        if fetched_at is None:
+            return False if day > now.date() else True
+        settled_at = datetime.combine(day + timedelta(days=self.settling_days + 1), datetime.min.time())
+        if fetched_at >= settled_at:
+            return False
+        return now - fetched_at >= timedelta(minutes=self.refresh_minutes)
+
+    def missing_ranges(self, platform, account_id, start_date, end_date, now=None):
+        """Retorna os intervalos contíguos (início, fim) que ainda precisam ser buscados na API"""
+        start_date, end_date = _to_date(start_date), _to_date(end_date)
+        now = now or datetime.now()
+
+        synced = {
+            day: datetime.fromisoformat(fetched_at)
+            for day, fetched_at in self.synced_days(platform, account_id, start_date, end_date).items()
+        }
+
+        ranges = []
+        current = None
+        for day in _date_range(start_date, end_date):
+            if self._needs_refresh(day, synced.get(day), now):
+                if current and current[1] == day - timedelta(days=1):
+                    current[1] = day
+                else:
+                    current = [day, day]
+                    ranges.append(current)
+        return [tuple(r) for r in ranges]
+
+    def save(self, platform, account_id, data, start_date, end_date, fetched_at=None):
+        """Substitui os dados do intervalo pelos recém-obtidos e marca os dias como sincronizados
+
+        `data` pode ser um DataFrame ou um iterável de DataFrames (lotes), gravados um a um
+        para que a memória fique limitada ao tamanho do lote.
+        """
+        start_date, end_date = _to_date(start_date), _to_date(end_date)
+        fetched_at = (fetched_at or datetime.now()).isoformat(timespec='seconds')
+        account_id = str(account_id)
+        batches = [data] if data is None or isinstance(data, pd.DataFrame) else data
+
+        with self._connect() as conn:
+            # Os lotes podem vir de geradores que esperam pela API (backoff, paginação): ficam
+            # numa tabela temporária da conexão, fora do banco, e o bloqueio de escrita só é
+            # tomado na troca final. Outras contas gravando ao mesmo tempo não ficam esperando.
+            conn.execute(f"CREATE TEMP TABLE staged_insights AS SELECT {_INSERT_COLUMNS} FROM insights WHERE 0")
+            for df in batches:
+                if df is None or df.empty:
+                    continue
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO staged_insights ({_INSERT_COLUMNS}) VALUES ({_INSERT_VALUES})",
+                    _insight_rows(platform, account_id, df)
+                )
+            conn.commit()
+
+            conn.execute(
+                "DELETE FROM insights WHERE platform = ? AND account_id = ? AND date BETWEEN ? AND ?",
+                (platform, account_id, start_date.isoformat(), end_date.isoformat())
+            )
+            conn.execute(f"INSERT OR REPLACE INTO insights ({_INSERT_COLUMNS}) SELECT {_INSERT_COLUMNS} FROM staged_insights")
+            _refresh_daily_totals(conn, platform, account_id, start_date, end_date)
+            conn.executemany(
+                "INSERT OR REPLACE INTO synced_days (platform, account_id, date, fetched_at) VALUES (?, ?, ?, ?)",
+                ((platform, account_id, day.isoformat(), fetched_at) for day in _date_range(start_date, end_date))
+            )
+
+    def replace_account(self, platform, account_id, data):
+        """Substitui todos os dados da conta pelos lotes de `data`, somando linhas de mesma chave
+
+        Usado na importação de arquivos: os lotes ficam numa tabela temporária enquanto o arquivo
+        é lido, e a conta só é apagada e regravada (numa única transação) depois do último lote.
+        Se a leitura falhar no meio, os dados anteriores da conta continuam intactos.
+        Retorna o período (início, fim) gravado ou None se não houver linhas.
+        """
+        account_id = str(account_id)
+        with self._connect() as conn:
+            conn.execute(f"CREATE TEMP TABLE staged_insights AS SELECT {_INSERT_COLUMNS} FROM insights WHERE 0")
+            for df in data:
+                if df is None or df.empty:
+                    continue
+                conn.executemany(
+                    f"INSERT INTO staged_insights ({_INSERT_COLUMNS}) VALUES ({_INSERT_VALUES})",
+                    _insight_rows(platform, account_id, df)
+                )
+            conn.commit()
+
+            _delete_account(conn, platform, account_id)
+            conn.execute(
+                f"""
+                INSERT INTO insights ({_INSERT_COLUMNS})
+                SELECT platform, account_id, date, campaign_id, MAX(campaign_name), {_METRIC_SUMS}
+                FROM staged_insights
+                GROUP BY platform, account_id, date, campaign_id
+                """
+            )
+            start_date, end_date = conn.execute("SELECT MIN(date), MAX(date) FROM staged_insights").fetchone()
+            if start_date is None:
+                return None
+            start_date, end_date = _to_date(start_date), _to_date(end_date)
+            _refresh_daily_totals(conn, platform, account_id, start_date, end_date)
+        return start_date, end_date
+
+    def delete_account(self, platform, account_id):
+        """Remove todos os dados armazenados de uma conta"""
+        with self._connect() as conn:
+            _delete_account(conn, platform, account_id)
+
+    def record_upload(self, content_hash, platform, account_id, source, rows, failures, start_date, end_date, summary):
+        """Registra a importação de um arquivo pelo hash do conteúdo, com o consolidado por campanha
+
+        `account_id` e o período são None quando o arquivo não tem data (nada foi gravado na conta).
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, platform, None if account_id is None else str(account_id), source, int(rows),
+                 json.dumps(failures),
+                 None if start_date is None else _to_date(start_date).isoformat(),
+                 None if end_date is None else _to_date(end_date).isoformat(),
+                 json.dumps(summary.to_dict('list')), datetime.now().isoformat(timespec='seconds'))
+            )
+
+    def find_upload(self, content_hash):
+        """Importação anterior de um conteúdo (dicionário com as colunas de uploads) ou None
+
+        `summary` volta como DataFrame, com as colunas gravadas.
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM uploads WHERE content_hash = ?", (content_hash,)).fetchone()
+        if row is None:
+            return None
+        upload = dict(row)
+        upload['failures'] = json.loads(upload['failures'])
+        upload['summary'] = pd.DataFrame(json.loads(upload['summary']))
+        return upload
+
+    def load(self, platform, account_id, start_date, end_date):
+        """Lê do disco os insights diários do intervalo"""
+        start_date, end_date = _to_date(start_date), _to_date(end_date)
+        with self._connect() as conn:
+            df = pd.read_sql_query(
+                f"""
+                SELECT platform, date, campaign_id, campaign_name, {_METRIC_LIST}
+                FROM insights
+                WHERE platform = ? AND account_id = ? AND date BETWEEN ? AND ?
+                ORDER BY date, campaign_name
+                """,
+                conn,
+                params=(platform, str(account_id), start_date.isoformat(), end_date.isoformat())
+            )
+        return compact(df)
+
+    def iter_chunks(self, platform, account_id, start_date, end_date, chunksize=100000):
+        """Lê os insights do intervalo em lotes de `chunksize` linhas (exportações grandes)"""
+        start_date, end_date = _to_date(start_date), _to_date(end_date)
+        with self._connect() as conn:
+            chunks = pd.read_sql_query(
+                f"""
+                SELECT platform, account_id, date, campaign_id, campaign_name, {_METRIC_LIST}
+                FROM insights
+                WHERE platform = ? AND account_id = ? AND date BETWEEN ? AND ?
+                ORDER BY date, campaign_name
+                """,
+                conn,
+                params=(platform, str(account_id), start_date.isoformat(), end_date.isoformat()),
+                chunksize=chunksize
+            )
+            for chunk in chunks:
+                yield compact(chunk)
+
+    def synced_days(self, platform, account_id, start_date, end_date):
+        """Dias sincronizados do intervalo: {data: momento da busca}"""
+        start_date, end_date = _to_date(start_date), _to_date(end_date)
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT date, fetched_at FROM synced_days
+                WHERE platform = ? AND account_id = ? AND date BETWEEN ? AND ?
+                """,
+                (platform, str(account_id), start_date.isoformat(), end_date.isoformat())
+            ).fetchall()
+        return {_to_date(day): fetched_at for day, fetched_at in rows}
+
+    def invalidate_recent(self, days=None):
+        """Marca os últimos dias como não sincronizados para que a próxima busca os atualize na API"""
+        days = self.settling_days if days is None else days
+        since = (date.today() - timedelta(days=days)).isoformat()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM synced_days WHERE date >= ?", (since,))
+
+    def data_version(self):
+        """Marca que muda a cada gravação no banco (modificação do arquivo e do WAL), sem consultá-lo"""
+        version = []
+        for path in (self.db_path, self.db_path + '-wal'):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            version += [stat.st_mtime_ns, stat.st_size]
+        return tuple(version)
+
+    def campaign_count(self, platform, account_id):
+        """Número de campanhas distintas já armazenadas para a conta"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(DISTINCT campaign_id) FROM insights WHERE platform = ? AND account_id = ?",
+                (platform, str(account_id))
+            ).fetchone()[0]
+
+    def sync(self, platform, account_id, start_date, end_date, fetch, load=True):
+        """Busca via `fetch(inicio, fim)` apenas os dias faltantes ou em consolidação e lê o resto do disco
+
+        `fetch` pode retornar um DataFrame ou um gerador de lotes (ver `save`). Com `load=False`
+        só atualiza o armazenamento e retorna None, para quem consulta apenas os agregados.
+        """
+        ranges = self.missing_ranges(platform, account_id, start_date, end_date)
+        # Dias servidos pelo disco contam como acerto; dias buscados na API, como falta
+        fetched_days = sum((range_end - range_start).days + 1 for range_start, range_end in ranges)
+        total_days = (_to_date(end_date) - _to_date(start_date)).days + 1
+        count('store.sync', f"{platform}:{account_id}", cache_hits=max(total_days - fetched_days, 0), cache_misses=fetched_days)
+
+        for range_start, range_end in ranges:
+            fetched_at = datetime.now()
+            df = fetch(range_start, range_end)
+            self.save(platform, account_id, df, range_start, range_end, fetched_at=fetched_at)
+        if not load:
+            return None
+        with timed('store.load', f"{platform}:{account_id}") as span:
+            df = self.load(platform, account_id, start_date, end_date)
+            span.add(rows=len(df))
+        return df
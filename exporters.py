@@ -0,0 +1,147 @@
+import gzip
+import os
+import pandas as pd
+import pyarrow as pa
+from dotenv import load_dotenv
+from data_store import INSIGHT_COLUMNS
+from instrumentation import timed
+from schema import compact
+
+load_dotenv()
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 100000))
+# Limite de linhas de uma planilha do Excel, incluindo o cabeçalho
+EXCEL_MAX_ROWS = 1048576
+# Colunas dos lotes de `iter_store_chunks`: usadas no cabeçalho de exportações sem linhas
+EXPORT_COLUMNS = ['platform', 'account_id'] + INSIGHT_COLUMNS
+
+EXPORT_FORMATS = {
+    'xlsx': {'label': 'Excel (.xlsx)', 'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'},
+    'csv.gz': {'label': 'CSV compactado (.csv.gz)', 'mime': 'application/gzip'},
+    'parquet': {'label': 'Parquet (.parquet)', 'mime': 'application/octet-stream'}
+}
+
+
+def iter_store_chunks(store, accounts, start_date, end_date, chunksize=None):
+    """Lotes do armazenamento local das contas [(plataforma, id da conta), ...] no período"""
+    for platform, account_id in accounts:
+        yield from store.iter_chunks(platform, account_id, start_date, end_date, chunksize or EXPORT_CHUNK_SIZE)
+
+
+def _at_least_one(chunks):
+    """Os lotes ou, se não houver nenhum, um lote vazio com as colunas do armazenamento
+
+    Assim todo arquivo sai válido e com cabeçalho (e o Parquet com o esquema), mesmo sem dados.
+    """
+    empty = True
+    for chunk in chunks:
+        empty = False
+        yield chunk
+    if empty:
+        yield compact(pd.DataFrame(columns=EXPORT_COLUMNS))
+
+
+def _excel_rows(chunk):
+    # float32 passa pelo texto para gravar 1.1 e não 1.100000023841858
+    float32_columns = [column for column in chunk.columns if chunk[column].dtype == 'float32']
+    if float32_columns:
+        chunk = chunk.assign(**{column: chunk[column].astype(str).astype('float64') for column in float32_columns})
+    # Categorias e datas viram objetos Python; valores ausentes viram células vazias
+    values = chunk.astype(object).where(chunk.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def write_excel(chunks, output, sheet_name='Dados', split_sheets=True, max_rows=EXCEL_MAX_ROWS):
+    """Grava os lotes em uma planilha no modo somente escrita do openpyxl (memória constante)
+
+    Ao atingir o limite de linhas, continua em "Dados 2", "Dados 3"... ou, com
+    `split_sheets=False`, gera ValueError. Retorna o número de linhas gravadas.
+    """
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = None
+    header = None
+    sheet_rows = 0
+    rows = 0
+
+    for chunk in _at_least_one(chunks):
+        if header is None:
+            header = list(chunk.columns)
+        for row in _excel_rows(chunk):
+            if sheet is None or sheet_rows >= max_rows:
+                if sheet is not None and not split_sheets:
+                    raise ValueError(f"A exportação passa do limite de {max_rows} linhas por planilha do Excel")
+                index = len(workbook.worksheets) + 1
+                sheet = workbook.create_sheet(sheet_name if index == 1 else f"{sheet_name} {index}")
+                sheet.append(header)
+                sheet_rows = 1
+            sheet.append(row)
+            sheet_rows += 1
+            rows += 1
+
+    if sheet is None:
+        workbook.create_sheet(sheet_name).append(header)
+    workbook.save(output)
+    return rows
+
+
+def write_csv_gz(chunks, output):
+    """Grava os lotes em CSV compactado com gzip; retorna o número de linhas gravadas"""
+    rows = 0
+    with gzip.GzipFile(fileobj=output if hasattr(output, 'write') else None,
+                       filename=None if hasattr(output, 'write') else output, mode='wb') as compressed:
+        for index, chunk in enumerate(_at_least_one(chunks)):
+            compressed.write(chunk.to_csv(index=False, header=index == 0).encode('utf-8'))
+            rows += len(chunk)
+    return rows
+
+
+def _arrow_table(chunk, schema=None):
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    if schema is None:
+        # Categorias viram texto: cada lote tem seu próprio dicionário e o Parquet já codifica por dicionário
+        fields = [
+            pa.field(field.name, pa.string()) if pa.types.is_dictionary(field.type) else field
+            for field in table.schema
+        ]
+        schema = pa.schema(fields)
+    return table.cast(schema), schema
+
+
+def write_parquet(chunks, output):
+    """Grava os lotes em um único arquivo Parquet, um grupo de linhas por lote"""
+    import pyarrow.parquet as pq
+    writer = None
+    rows = 0
+    try:
+        for chunk in _at_least_one(chunks):
+            table, schema = _arrow_table(chunk, writer.schema if writer is not None else None)
+            if writer is None:
+                writer = pq.ParquetWriter(output, schema, compression='zstd')
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+WRITERS = {
+    'xlsx': write_excel,
+    'csv.gz': write_csv_gz,
+    'parquet': write_parquet
+}
+
+
+def _output_size(output):
+    if hasattr(output, 'getbuffer'):
+        return output.getbuffer().nbytes
+    return os.path.getsize(output) if isinstance(output, str) and os.path.exists(output) else 0
+
+
+def export_chunks(chunks, output, file_format='xlsx'):
+    """Grava os lotes no formato escolhido ('xlsx', 'csv.gz' ou 'parquet')"""
+    with timed(f"export.{file_format}") as span:
+        rows = WRITERS[file_format](chunks, output)
+        span.add(rows=rows, bytes=_output_size(output))
+    return rows
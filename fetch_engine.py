@@ -0,0 +1,153 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from dotenv import load_dotenv
+from api_connectors import FacebookAdsConnector, GoogleAdsConnector, aggregate_by_campaign, to_long_format
+from data_store import InsightsStore
+from instrumentation import timed
+from transport import is_transient_error
+
+load_dotenv()
+
+CONNECTORS = {
+    'Facebook': FacebookAdsConnector,
+    'Google': GoogleAdsConnector
+}
+
+# Limite de requisições simultâneas por plataforma
+PLATFORM_CONCURRENCY = {
+    'Facebook': int(os.getenv('FACEBOOK_MAX_CONCURRENCY', 4)),
+    'Google': int(os.getenv('GOOGLE_ADS_MAX_CONCURRENCY', 8))
+}
+MAX_WORKERS = int(os.getenv('FETCH_MAX_WORKERS', 16))
+
+
+def _split_ids(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def configured_accounts():
+    """Lista as contas configuradas no ambiente como pares (plataforma, id da conta)"""
+    facebook_ids = _split_ids(os.getenv('FACEBOOK_AD_ACCOUNT_IDS')) or _split_ids(os.getenv('FACEBOOK_AD_ACCOUNT_ID'))
+    google_ids = _split_ids(os.getenv('GOOGLE_ADS_CUSTOMER_IDS')) or _split_ids(os.getenv('GOOGLE_ADS_CUSTOMER_ID'))
+    return [('Facebook', account_id) for account_id in facebook_ids] + [('Google', account_id) for account_id in google_ids]
+
+
+def fetch_errors(df):
+    """Falhas por conta da busca que gerou `df`: {(plataforma, id da conta): erro}"""
+    return df.attrs.get('fetch_errors', {})
+
+
+class FetchEngine:
+    """Busca os dados de várias contas e plataformas em paralelo e consolida em um único DataFrame"""
+
+    def __init__(self, store=None, max_workers=None, concurrency=None):
+        self.store = store if store is not None else InsightsStore()
+        self.max_workers = max_workers or MAX_WORKERS
+        limits = dict(PLATFORM_CONCURRENCY, **(concurrency or {}))
+        self._semaphores = {platform: threading.BoundedSemaphore(limit) for platform, limit in limits.items()}
+        self._connectors = {}
+        self._lock = threading.Lock()
+
+    def connector(self, platform, account_id):
+        """Retorna o conector da conta, reaproveitando a instância entre chamadas"""
+        key = (platform, str(account_id))
+        with self._lock:
+            if key not in self._connectors:
+                self._connectors[key] = CONNECTORS[platform](account_id, store=self.store)
+            return self._connectors[key]
+
+    def _fetch_account(self, platform, account_id, start_date, end_date, granularity, breakdowns, errors):
+        # Repetições e backoff ficam no transporte, por página; aqui só o limite de concorrência
+        connector = self.connector(platform, account_id)
+        with timed('fetch', f"{platform}:{account_id}") as span:
+            with self._semaphores[platform]:
+                try:
+                    if granularity:
+                        df = connector.get_insights_data(start_date, end_date, granularity, breakdowns)
+                    else:
+                        df = aggregate_by_campaign(connector.sync_daily_data(start_date, end_date))
+                except Exception as e:
+                    df = self._stored_data(platform, account_id, start_date, end_date, granularity, breakdowns, e, errors)
+            span.add(rows=len(df))
+
+        df.insert(0, 'account_id', str(account_id))
+        return df
+
+    def _stored_data(self, platform, account_id, start_date, end_date, granularity, breakdowns, error, errors):
+        """Com a API instável, usa os dias já armazenados da conta em vez de deixá-la em branco"""
+        if not is_transient_error(error) or breakdowns or granularity not in (None, 'daily'):
+            raise error
+        df = self.store.load(platform, account_id, start_date, end_date)
+        if df.empty:
+            raise error
+        # A falha continua registrada para quem chamou, mesmo com os dados servidos
+        errors[(platform, str(account_id))] = error
+        print(f"Usando dados armazenados da conta {account_id} ({platform}): {str(error)}")
+        return to_long_format(df) if granularity else aggregate_by_campaign(df)
+
+    def _sync_account(self, platform, account_id, start_date, end_date):
+        connector = self.connector(platform, account_id)
+        with timed('fetch.sync', f"{platform}:{account_id}"):
+            with self._semaphores[platform]:
+                connector.sync_daily_data(start_date, end_date, load=False)
+
+    def sync(self, accounts, start_date, end_date):
+        """Atualiza o armazenamento local das contas em paralelo, sem montar o DataFrame do período
+
+        Para quem lê só os agregados do armazenamento (painel, pré-carga). Retorna as falhas
+        desta chamada: {(plataforma, id da conta): erro}; os dias já armazenados continuam lá.
+        """
+        errors = {}
+        if not accounts:
+            return errors
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(accounts))) as pool:
+            futures = {
+                pool.submit(self._sync_account, platform, account_id, start_date, end_date): (platform, str(account_id))
+                for platform, account_id in accounts
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[futures[future]] = e
+                    print(f"Erro ao sincronizar a conta {futures[future][1]} ({futures[future][0]}): {str(e)}")
+        return errors
+
+    def fetch(self, accounts, start_date, end_date, granularity=None, breakdowns=()):
+        """Busca as contas [(plataforma, id da conta), ...] em paralelo
+
+        Sem `granularity` retorna uma linha por campanha; com 'daily' ou 'hourly' (e `breakdowns`
+        opcionais) retorna o formato longo compacto dos conectores. As contas que falharam nesta
+        chamada (mesmo as servidas pelo armazenamento local) ficam em `fetch_errors(df)`.
+        """
+        errors = {}
+        frames = []
+        if accounts:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(accounts))) as pool:
+                futures = {
+                    pool.submit(self._fetch_account, platform, account_id, start_date, end_date, granularity, breakdowns, errors): (platform, str(account_id))
+                    for platform, account_id in accounts
+                }
+                for future in as_completed(futures):
+                    try:
+                        frames.append(future.result())
+                    except Exception as e:
+                        errors[futures[future]] = e
+                        print(f"Erro ao obter dados da conta {futures[future][1]} ({futures[future][0]}): {str(e)}")
+
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            df = pd.DataFrame()
+        else:
+            df = pd.concat(frames, ignore_index=True)
+            # Categorias diferentes entre contas viram object no concat; recompacta o resultado
+            df = to_long_format(df) if granularity else df
+        df.attrs['fetch_errors'] = errors
+        return df
+
+
+def fetch_all_accounts(start_date, end_date, accounts=None, granularity=None, breakdowns=()):
+    """Atalho para buscar todas as contas configuradas no ambiente"""
+    return FetchEngine().fetch(accounts or configured_accounts(), start_date, end_date, granularity, breakdowns)
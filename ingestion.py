@@ -0,0 +1,273 @@
+import argparse
+import codecs
+import csv
+import hashlib
+import os
+from itertools import chain, islice
+import pandas as pd
+from dotenv import load_dotenv
+from data_store import UPLOAD_ACCOUNT_PREFIX, InsightsStore
+from instrumentation import timed
+from schema import FILE_SOURCES, SOURCES, compact, detect_source, normalize, source_columns
+
+load_dotenv()
+
+CHUNK_SIZE = int(os.getenv('INGESTION_CHUNK_SIZE', 100000))
+# Só o começo do arquivo é lido para achar o cabeçalho: exports do Google Ads trazem
+# o título do relatório e o período nas primeiras linhas
+SNIFF_BYTES = 64 * 1024
+SNIFF_ROWS = 10
+SEPARATORS = (';', ',', '\t')
+
+# Colunas lidas do arquivo: apenas as que vão para o armazenamento local
+STORED_COLUMNS = ['campaign_name', 'date', 'spend', 'impressions', 'clicks', 'conversions', 'reach']
+NUMERIC_COLUMNS = ['spend', 'impressions', 'clicks', 'conversions', 'reach']
+
+
+def is_xlsx(filename):
+    return str(filename).lower().endswith('.xlsx')
+
+
+def find_header(rows, platform=None):
+    """Procura o cabeçalho entre as primeiras linhas; retorna (posição, origem)
+
+    Sem `platform`, a plataforma é deduzida das colunas (Facebook pt/en ou Google).
+    """
+    for position, row in enumerate(rows):
+        source = detect_source(row, platform)
+        if source is not None:
+            return position, source
+    expected = [SOURCES[name]['required'] for name in FILE_SOURCES if platform in (None, SOURCES[name]['platform'])]
+    raise ValueError(
+        f"O arquivo {f'do {platform} ' if platform else ''}não contém as colunas necessárias. Colunas esperadas: "
+        + " ou ".join(", ".join(columns) for columns in expected)
+    )
+
+
+def _split_line(line):
+    """Separa uma linha de CSV pelo separador mais frequente nela; retorna (colunas, separador)"""
+    separator = max(SEPARATORS, key=line.count)
+    return [column.strip() for column in next(csv.reader([line], delimiter=separator), [])], separator
+
+
+def sniff_csv(file):
+    """Lê só os primeiros bytes do CSV; retorna (cabeçalhos candidatos, separadores, encoding)
+
+    Exports "CSV para Excel" do Google Ads vêm em UTF-16 e separados por tabulação.
+    """
+    sample = file.read(SNIFF_BYTES)
+    file.seek(0)
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encoding = 'utf-16'
+    else:
+        encoding = 'utf-8-sig'
+    lines = sample.decode(encoding, errors='replace').splitlines()
+    if len(sample) == SNIFF_BYTES:
+        # A última linha da amostra pode estar cortada
+        lines = lines[:-1]
+    rows, separators = zip(*[_split_line(line) for line in lines[:SNIFF_ROWS]]) if lines else ((), ())
+    return list(rows), list(separators), encoding
+
+
+def _iter_csv_chunks(file, columns, separator, encoding, skiprows, decimal, chunksize, progress):
+    size = _file_size(file)
+    reader = pd.read_csv(
+        file,
+        sep=separator,
+        skiprows=skiprows,
+        usecols=list(columns),
+        # Texto explícito para nome e data; números são lidos direto pelo parser C quando estão limpos
+        dtype={source: str for source, target in columns.items() if target in ('campaign_name', 'date')},
+        decimal=decimal,
+        thousands='.' if decimal == ',' else ',',
+        encoding=encoding,
+        chunksize=chunksize
+    )
+    for chunk in reader:
+        yield chunk
+        if progress and size:
+            progress(min(file.tell() / size, 1.0))
+
+
+def open_xlsx(file):
+    """(iterador de linhas, total de linhas) da primeira planilha, lida pelo calamine (Rust)
+
+    Bem mais rápido e com menos memória que montar as células do openpyxl; células vazias
+    chegam como ''.
+    """
+    from python_calamine import CalamineWorkbook
+    sheet = CalamineWorkbook.from_filelike(file).get_sheet_by_index(0)
+    return sheet.iter_rows(), sheet.height
+
+
+def _iter_xlsx_chunks(rows, header, columns, total, chunksize, progress):
+    names = list(columns)
+    indices = [header.index(name) for name in names]
+    batch = []
+    read = 0
+    for row in rows:
+        # None em vez de '' mantém numéricas as colunas com células vazias
+        batch.append([row[index] if index < len(row) and row[index] != '' else None for index in indices])
+        if len(batch) >= chunksize:
+            read += len(batch)
+            yield pd.DataFrame(batch, columns=names)
+            batch = []
+            if progress and total:
+                progress(min(read / total, 1.0))
+    if batch:
+        yield pd.DataFrame(batch, columns=names)
+
+
+def _file_size(file):
+    position = file.tell()
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(position)
+    return size
+
+
+def file_hash(file):
+    """SHA-256 do conteúdo, lido em blocos de 1 MB; o arquivo volta ao início"""
+    digest = hashlib.sha256()
+    for block in iter(lambda: file.read(1024 * 1024), b''):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _stored_result(upload):
+    """Resultado de uma importação anterior do mesmo conteúdo, com o consolidado gravado no registro"""
+    data = upload['summary'].reindex(columns=['campaign_name'] + NUMERIC_COLUMNS)
+    data.insert(0, 'platform', upload['platform'])
+    return {
+        'rows': upload['rows'],
+        'failures': upload['failures'],
+        'account_id': upload['account_id'],
+        'platform': upload['platform'],
+        'source': upload['source'],
+        'content_hash': upload['content_hash'],
+        'reused': True,
+        'data': compact(data)
+    }
+
+
+def ingest_file(file, filename, platform=None, store=None, account_id=None, chunksize=None, progress=None,
+                content_hash=None, reuse=True):
+    """Importa um CSV/XLSX em lotes com memória limitada
+
+    A origem (e a plataforma, se `platform` não for informada) é detectada pelo cabeçalho.
+    Com coluna de data, os lotes substituem no armazenamento local os dados da conta `account_id`
+    (de uma importação anterior), numa única transação ao fim da leitura. Um arquivo de mesmo
+    conteúdo já importado é servido do registro de uploads sem ser lido de novo (`reuse`).
+    Retorna um dicionário com o número de linhas, as falhas de conversão por coluna e o
+    consolidado por campanha.
+    """
+    if isinstance(file, str):
+        with open(file, 'rb') as handle:
+            return ingest_file(handle, filename, platform, store, account_id, chunksize, progress, content_hash, reuse)
+
+    store = store if store is not None else InsightsStore()
+    content_hash = content_hash or file_hash(file)
+    upload = store.find_upload(content_hash) if reuse else None
+    # Arquivos sem data não gravam nada na conta: servem para qualquer `account_id`
+    if (upload and platform in (None, upload['platform'])
+            and (upload['account_id'] is None or account_id in (None, upload['account_id']))):
+        if progress:
+            progress(1.0)
+        return _stored_result(upload)
+
+    if is_xlsx(filename):
+        rows_iterator, total = open_xlsx(file)
+        preview = list(islice(rows_iterator, SNIFF_ROWS))
+        position, source = find_header([[str(value).strip() for value in row] for row in preview], platform)
+        header = [str(value).strip() for value in preview[position]]
+        remaining = chain(preview[position + 1:], rows_iterator)
+    else:
+        preview, separators, encoding = sniff_csv(file)
+        position, source = find_header(preview, platform)
+        header = preview[position]
+    platform = SOURCES[source]['platform']
+    columns = source_columns(header, source, wanted=STORED_COLUMNS)
+    decimal = SOURCES[source]['decimal']
+    chunksize = chunksize or CHUNK_SIZE
+    has_date = 'date' in columns.values()
+
+    # Sem data nada é gravado no armazenamento, então não há conta
+    account_id = (account_id or f"{UPLOAD_ACCOUNT_PREFIX}{os.path.basename(str(filename))}") if has_date else None
+
+    if is_xlsx(filename):
+        chunks = _iter_xlsx_chunks(remaining, header, columns, total, chunksize, progress)
+    else:
+        chunks = _iter_csv_chunks(file, columns, separators[position], encoding, position, decimal, chunksize, progress)
+
+    rows = 0
+    failures = {}
+    totals = None
+
+    def daily_batches():
+        nonlocal rows, totals
+        for chunk in chunks:
+            # float64 até o fim: os lotes são gravados no armazenamento; só o consolidado é compactado
+            chunk = normalize(chunk, source, compact_dtypes=False)
+            rows += len(chunk)
+            for column, count in chunk.attrs['parse_failures'].items():
+                failures[column] = failures.get(column, 0) + count
+
+            # Consolidado por campanha: limitado ao número de campanhas, não ao tamanho do arquivo
+            chunk_totals = chunk.groupby('campaign_name', observed=True)[NUMERIC_COLUMNS].sum()
+            chunk_totals.index = chunk_totals.index.astype(str)
+            totals = chunk_totals if totals is None else totals.add(chunk_totals, fill_value=0)
+
+            if has_date:
+                yield chunk.groupby(['date', 'campaign_id', 'campaign_name'], as_index=False, observed=True, dropna=False)[NUMERIC_COLUMNS].sum()
+
+    period = None
+    with timed('ingestion', f"{platform}:{account_id}" if account_id else platform) as span:
+        if has_date:
+            # A conta só é substituída depois que o arquivo inteiro foi lido sem erros
+            period = store.replace_account(platform, account_id, daily_batches())
+        else:
+            for _ in daily_batches():
+                pass
+        span.add(rows=rows, bytes=_file_size(file))
+
+    if progress:
+        progress(1.0)
+
+    summary = pd.DataFrame(columns=['campaign_name'] + NUMERIC_COLUMNS)
+    if totals is not None:
+        summary = totals.reset_index()
+    store.record_upload(content_hash, platform, account_id, source, rows, failures, *(period or (None, None)), summary)
+
+    data = summary.copy()
+    data.insert(0, 'platform', platform)
+    if totals is not None:
+        data = compact(data)
+
+    return {
+        'rows': rows,
+        'failures': failures,
+        'account_id': account_id,
+        'platform': platform,
+        'source': source,
+        'content_hash': content_hash,
+        'reused': False,
+        'data': data
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Importa exports CSV/XLSX do Facebook ou Google Ads para o armazenamento local')
+    parser.add_argument('file')
+    parser.add_argument('--platform', choices=['Facebook', 'Google'], help='Padrão: detectada pelo cabeçalho')
+    parser.add_argument('--account-id')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--force', action='store_true', help='Importa de novo mesmo se o conteúdo já foi importado')
+    args = parser.parse_args()
+
+    result = ingest_file(args.file, args.file, args.platform, account_id=args.account_id, chunksize=args.chunksize,
+                         progress=lambda fraction: print(f"\r{fraction:.0%}", end='', flush=True), reuse=not args.force)
+    print(f"\n{result['rows']} linhas {'já importadas anteriormente' if result['reused'] else 'importadas'} do {result['platform']}",
+          f"(conta {result['account_id']})" if result['account_id'] else '')
+    for column, count in result['failures'].items():
+        print(f"  {count} valores inválidos em {column}")
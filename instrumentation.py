@@ -0,0 +1,170 @@
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Uma linha JSON por etapa no logger "ads_dashboard.perf"
+PERF_LOG = os.getenv('PERF_LOG', '0') == '1'
+# Arquivo no formato texto do Prometheus (ex.: para o textfile collector do node_exporter)
+METRICS_FILE = os.getenv('METRICS_FILE')
+METRICS_FILE_INTERVAL_SECONDS = float(os.getenv('METRICS_FILE_INTERVAL_SECONDS', 15))
+# Quantas execuções recentes ficam disponíveis no painel de depuração
+PERF_RECENT_SPANS = int(os.getenv('PERF_RECENT_SPANS', 200))
+
+COUNTERS = ['calls', 'errors', 'seconds', 'rows', 'bytes', 'pages', 'retries', 'cache_hits', 'cache_misses']
+
+logger = logging.getLogger('ads_dashboard.perf')
+if PERF_LOG and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def _label_value(value):
+    """Escapa barra invertida, aspas e quebras de linha (contas como upload-<arquivo> podem contê-las)"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Recorder:
+    """Totais por etapa e conta (tempo, linhas, bytes, páginas, tentativas, acertos de cache)"""
+
+    def __init__(self, recent_spans=None):
+        self._stats = {}
+        self._recent = deque(maxlen=recent_spans or PERF_RECENT_SPANS)
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+
+    def record(self, stage, account=None, seconds=None, error=False, **amounts):
+        key = (stage, str(account or ''))
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = dict.fromkeys(COUNTERS, 0)
+                stats['max_seconds'] = 0.0
+            if seconds is not None:
+                stats['calls'] += 1
+                stats['seconds'] += seconds
+                stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            if error:
+                stats['errors'] += 1
+            for name, value in amounts.items():
+                stats[name] += value
+            if seconds is not None:
+                self._recent.append({
+                    'at': datetime.now().isoformat(timespec='seconds'),
+                    'stage': stage,
+                    'account': key[1],
+                    'seconds': round(seconds, 4),
+                    'error': error,
+                    **amounts
+                })
+
+        if PERF_LOG:
+            logger.info(json.dumps({'stage': stage, 'account': key[1], 'seconds': seconds, 'error': error, **amounts}, default=str))
+        if METRICS_FILE and time.monotonic() - self._last_write >= METRICS_FILE_INTERVAL_SECONDS:
+            self._last_write = time.monotonic()
+            self.write_prometheus(METRICS_FILE)
+
+    def snapshot(self):
+        """Totais por etapa e conta, com o tempo médio por chamada"""
+        with self._lock:
+            rows = [{'stage': stage, 'account': account, **stats} for (stage, account), stats in self._stats.items()]
+        df = pd.DataFrame(rows, columns=['stage', 'account'] + COUNTERS + ['max_seconds'])
+        df['avg_seconds'] = (df['seconds'] / df['calls']).where(df['calls'] > 0, 0)
+        return df.sort_values('seconds', ascending=False, ignore_index=True)
+
+    def recent(self):
+        with self._lock:
+            return pd.DataFrame(list(reversed(self._recent)))
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            items = sorted(self._stats.items())
+        for name in COUNTERS + ['max_seconds']:
+            metric = f"ads_dashboard_stage_{name}" if name == 'max_seconds' else f"ads_dashboard_stage_{name}_total"
+            lines.append(f"# TYPE {metric} {'gauge' if name == 'max_seconds' else 'counter'}")
+            for (stage, account), stats in items:
+                labels = f'stage="{_label_value(stage)}",account="{_label_value(account)}"'
+                lines.append(f"{metric}{{{labels}}} {stats[name]}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Grava o texto do Prometheus de forma atômica"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as handle:
+            handle.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._recent.clear()
+
+
+RECORDER = Recorder()
+if METRICS_FILE:
+    # Garante o arquivo com os totais finais mesmo dentro do intervalo de gravação
+    atexit.register(lambda: RECORDER.write_prometheus(METRICS_FILE))
+
+
+class Span:
+    """Quantidades acumuladas durante uma etapa medida com `timed`"""
+
+    def __init__(self, stage, account=None):
+        self.stage = stage
+        self.account = account
+        self.amounts = {}
+
+    def add(self, **amounts):
+        for name, value in amounts.items():
+            self.amounts[name] = self.amounts.get(name, 0) + value
+
+
+@contextmanager
+def timed(stage, account=None):
+    """Mede o tempo de parede da etapa; use `span.add(rows=..., bytes=...)` para as quantidades"""
+    span = Span(stage, account)
+    start = time.perf_counter()
+    error = False
+    try:
+        yield span
+    except Exception:
+        error = True
+        raise
+    finally:
+        RECORDER.record(stage, account, time.perf_counter() - start, error, **span.amounts)
+
+
+def count(stage, account=None, **amounts):
+    """Soma quantidades a uma etapa sem medir tempo (páginas, tentativas, acertos de cache...)"""
+    RECORDER.record(stage, account, **amounts)
+
+
+def instrumented(stage):
+    """Decorador: mede a função e, se ela retornar um DataFrame, conta as linhas"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage) as span:
+                result = func(*args, **kwargs)
+                if isinstance(result, pd.DataFrame):
+                    span.add(rows=len(result))
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,44 @@
+import pandas as pd
+
+# Uma única tabela de tradução por localidade: remove moeda, espaços, % e separador de milhar
+# e normaliza o separador decimal para ponto, tudo na mesma passada sobre as strings
+_IGNORED_CHARS = 'R$% \xa0'
+TRANSLATION_TABLES = {
+    ',': str.maketrans({',': '.', '.': None, **{char: None for char in _IGNORED_CHARS}}),
+    '.': str.maketrans({',': None, **{char: None for char in _IGNORED_CHARS}})
+}
+
+# Valores que as plataformas usam para "sem dado" e que não contam como falha de conversão
+EMPTY_VALUES = ['', '-', '--', '—', 'nan', 'None']
+
+
+def parse_locale_numbers(series, decimal=',', percent=False):
+    """Converte moeda, inteiros com milhar e percentuais em formato local para float
+
+    Retorna a série convertida e o número de células que não puderam ser convertidas.
+    Percentuais são devolvidos como fração (12,5% -> 0.125).
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.astype(float)
+        failed = 0
+    else:
+        text = series.astype(str).str.strip()
+        empty = series.isna() | text.isin(EMPTY_VALUES)
+        values = pd.to_numeric(text.str.translate(TRANSLATION_TABLES[decimal]).mask(empty), errors='coerce')
+        failed = int((values.isna() & ~empty).sum())
+
+    if percent:
+        values = values / 100
+    return values, failed
+
+
+def parse_locale_columns(df, columns, decimal=',', percent_columns=()):
+    """Converte as colunas presentes no DataFrame e retorna {coluna: falhas} das que tiveram falhas"""
+    failures = {}
+    for column in columns:
+        if column not in df.columns:
+            continue
+        df[column], failed = parse_locale_numbers(df[column], decimal, percent=column in percent_columns)
+        if failed:
+            failures[column] = failed
+    return failures
@@ -0,0 +1,186 @@
+import threading
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from instrumentation import count, timed
+
+# Métricas que podem ser somadas entre campanhas, dias e contas; as razões são derivadas delas
+ADDITIVE_COLUMNS = ['spend', 'impressions', 'clicks', 'conversions', 'reach', 'purchases',
+                    'video_p25', 'video_p50', 'video_p75', 'video_p100']
+
+
+def sum_columns(df, columns=None):
+    """Soma cada coluna uma única vez, acumulando em float64 (somas longas em float32 perdem centavos)"""
+    columns = columns or ADDITIVE_COLUMNS
+    return {
+        column: float(df[column].to_numpy().sum(dtype='float64')) if column in df.columns else 0.0
+        for column in columns
+    }
+
+
+def derive_metrics(totals):
+    """KPIs do painel a partir das somas aditivas"""
+    spend = totals.get('spend', 0.0)
+    impressions = totals.get('impressions', 0.0)
+    clicks = totals.get('clicks', 0.0)
+    conversions = totals.get('conversions', 0.0)
+    return {
+        'total_spend': spend,
+        'total_impressions': impressions,
+        'total_clicks': clicks,
+        'total_conversions': conversions,
+        'total_reach': totals.get('reach', 0.0),
+        'avg_ctr': clicks / impressions * 100 if impressions > 0 else 0,
+        'avg_cpc': spend / clicks if clicks > 0 else 0,
+        'avg_cpm': spend / (impressions / 1000) if impressions > 0 else 0,
+        'conversion_rate': conversions / clicks * 100 if clicks > 0 else 0,
+        'cpa': spend / conversions if conversions > 0 else 0
+    }
+
+
+def _contiguous_ranges(days):
+    """Agrupa datas ordenadas em intervalos contíguos (início, fim)"""
+    ranges = []
+    for day in days:
+        if ranges and ranges[-1][1] == day - timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(r) for r in ranges]
+
+
+def _day_values(values):
+    return pd.to_datetime(pd.Series(values)).to_numpy().astype('datetime64[D]')
+
+
+class MetricsCube:
+    """Agregados aditivos por plataforma × conta × campanha × dia, atualizados de forma incremental
+
+    Cada conta guarda suas células (dia, campanha) ordenadas por dia e, sob demanda, a soma
+    acumulada por dia. Os totais de qualquer período saem da diferença entre duas posições
+    dessa soma acumulada, sem reler as linhas brutas.
+    """
+
+    def __init__(self):
+        self._cells = {}
+        self._prefix = {}
+        self._synced = {}
+        self._lock = threading.Lock()
+        self._account_locks = {}
+
+    def update(self, platform, account_id, df, days=None):
+        """Substitui as células dos dias `days` (por padrão, os dias presentes em `df`) pelas linhas de `df`"""
+        key = (platform, str(account_id))
+        if df is None or df.empty:
+            new_cells = None
+        else:
+            rows = pd.DataFrame({
+                'date': _day_values(df['date']),
+                'campaign_id': df['campaign_id'].astype(str).to_numpy() if 'campaign_id' in df.columns else df['campaign_name'].astype(str).to_numpy(),
+                'campaign_name': df['campaign_name'].astype(str).to_numpy()
+            })
+            for column in ADDITIVE_COLUMNS:
+                rows[column] = df[column].to_numpy(dtype='float64') if column in df.columns else 0.0
+            new_cells = rows.groupby(['date', 'campaign_id', 'campaign_name'], as_index=False, sort=False)[ADDITIVE_COLUMNS].sum()
+
+        replaced = _day_values(days) if days is not None else (new_cells['date'].unique() if new_cells is not None else [])
+
+        with self._lock:
+            cells = self._cells.get(key)
+            if cells is not None and len(replaced):
+                cells = cells[~cells['date'].isin(replaced)]
+            frames = [frame for frame in (cells, new_cells) if frame is not None and not frame.empty]
+            if frames:
+                self._cells[key] = pd.concat(frames, ignore_index=True).sort_values('date', kind='stable', ignore_index=True)
+            else:
+                self._cells.pop(key, None)
+            self._prefix.pop(key, None)
+
+    def _account_lock(self, key):
+        with self._lock:
+            return self._account_locks.setdefault(key, threading.Lock())
+
+    def sync_from_store(self, store, platform, account_id, start_date, end_date):
+        """Carrega do armazenamento apenas os dias novos ou buscados de novo desde a última sincronização
+
+        O cubo é compartilhado entre sessões: sincronizações da mesma conta rodam uma de cada vez,
+        do confronto com o armazenamento até a marcação dos dias carregados.
+        """
+        key = (platform, str(account_id))
+        start_day, end_day = pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date()
+        with self._account_lock(key):
+            synced = store.synced_days(platform, account_id, start_date, end_date)
+            with self._lock:
+                known = self._synced.setdefault(key, {})
+
+            # Dias invalidados no armazenamento saem do cubo até serem buscados de novo
+            removed = [day for day in known if day not in synced and start_day <= day <= end_day]
+            if removed:
+                self.update(platform, account_id, None, days=removed)
+                for day in removed:
+                    known.pop(day)
+
+            stale = sorted(day for day, fetched_at in synced.items() if known.get(day) != fetched_at)
+            count('metrics.cube_sync', f"{platform}:{account_id}", cache_hits=len(synced) - len(stale), cache_misses=len(stale))
+            for range_start, range_end in _contiguous_ranges(stale):
+                days = pd.date_range(range_start, range_end)
+                self.update(platform, account_id, store.load(platform, account_id, range_start, range_end), days=days)
+            for day in stale:
+                known[day] = synced[day]
+
+    def _prefix_sums(self, key):
+        """(dias, somas acumuladas) da conta; a primeira linha das somas é zero"""
+        prefix = self._prefix.get(key)
+        if prefix is None:
+            cells = self._cells.get(key)
+            if cells is None:
+                return None
+            daily = cells.groupby('date', sort=True)[ADDITIVE_COLUMNS].sum()
+            sums = np.vstack([np.zeros(len(ADDITIVE_COLUMNS)), np.cumsum(daily.to_numpy(), axis=0)])
+            prefix = (daily.index.to_numpy().astype('datetime64[D]'), sums)
+            self._prefix[key] = prefix
+        return prefix
+
+    def totals(self, accounts, start_date, end_date, campaigns=None):
+        """Somas aditivas das contas [(plataforma, id da conta), ...] no período, ou None sem dados
+
+        Com `campaigns` (ids ou nomes) as células do período são filtradas e somadas.
+        """
+        start, end = np.datetime64(pd.Timestamp(start_date).date(), 'D'), np.datetime64(pd.Timestamp(end_date).date(), 'D')
+        totals = np.zeros(len(ADDITIVE_COLUMNS))
+        found = False
+        with self._lock:
+            for platform, account_id in accounts:
+                key = (platform, str(account_id))
+                if campaigns is None:
+                    prefix = self._prefix_sums(key)
+                    if prefix is None:
+                        continue
+                    days, sums = prefix
+                    first, last = np.searchsorted(days, start, 'left'), np.searchsorted(days, end, 'right')
+                    if last > first:
+                        totals += sums[last] - sums[first]
+                        found = True
+                else:
+                    cells = self._cells.get(key)
+                    if cells is None:
+                        continue
+                    days = cells['date'].to_numpy().astype('datetime64[D]')
+                    period = cells.iloc[np.searchsorted(days, start, 'left'):np.searchsorted(days, end, 'right')]
+                    period = period[period['campaign_id'].isin(campaigns) | period['campaign_name'].isin(campaigns)]
+                    if not period.empty:
+                        totals += period[ADDITIVE_COLUMNS].to_numpy().sum(axis=0)
+                        found = True
+        return dict(zip(ADDITIVE_COLUMNS, totals.tolist())) if found else None
+
+    def metrics(self, accounts, start_date, end_date, campaigns=None):
+        """KPIs derivados das somas do período, ou None sem dados"""
+        with timed('metrics.cube'):
+            totals = self.totals(accounts, start_date, end_date, campaigns)
+            return derive_metrics(totals) if totals is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._prefix.clear()
+            self._synced.clear()
@@ -0,0 +1,117 @@
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+from data_store import REFRESH_MINUTES, InsightsStore
+from fetch_engine import FetchEngine, configured_accounts
+from instrumentation import timed
+
+load_dotenv()
+
+# Janelas pré-carregadas além de "ontem": últimos N dias até hoje (o painel abre nos últimos 30)
+WINDOW_DAYS = [int(days) for days in os.getenv('PREFETCH_WINDOW_DAYS', '7,30,90').split(',') if days.strip()]
+PREFETCH_INTERVAL_MINUTES = int(os.getenv('PREFETCH_INTERVAL_MINUTES', 30))
+# Horário em que o modo contínuo trabalha: começa antes do expediente e para à noite
+PREFETCH_START_HOUR = int(os.getenv('PREFETCH_START_HOUR', 6))
+PREFETCH_END_HOUR = int(os.getenv('PREFETCH_END_HOUR', 20))
+
+
+def default_windows(today=None):
+    """{nome: (início, fim)} das janelas padrão do painel"""
+    today = today or date.today()
+    yesterday = today - timedelta(days=1)
+    windows = {'ontem': (yesterday, yesterday)}
+    for days in WINDOW_DAYS:
+        windows[f"últimos {days} dias"] = (today - timedelta(days=days), today)
+    return windows
+
+
+def seconds_until_active(now, start_hour=None, end_hour=None):
+    """0 dentro do horário de trabalho; fora dele, os segundos até o próximo início"""
+    start_hour = PREFETCH_START_HOUR if start_hour is None else start_hour
+    end_hour = PREFETCH_END_HOUR if end_hour is None else end_hour
+    if start_hour <= now.hour < end_hour:
+        return 0
+    next_start = now.replace(hour=start_hour, minute=0, second=0, microsecond=0)
+    if now.hour >= end_hour:
+        next_start += timedelta(days=1)
+    return (next_start - now).total_seconds()
+
+
+class PrefetchWorker:
+    """Mantém o armazenamento local aquecido para as janelas padrão do painel
+
+    Aquecer aqui é só sincronizar: cada execução busca, com os conectores de sempre, os dias
+    faltantes ou em consolidação da janela mais longa (que contém as demais). Não há o que
+    pré-agregar, já que o painel consulta as somas direto no SQLite (daily_totals é mantida a
+    cada gravação). Os dias recentes são buscados de novo `interval_minutes` antes de o painel
+    considerá-los vencidos (INSIGHTS_REFRESH_MINUTES), para que o primeiro usuário não espere pela API.
+    """
+
+    def __init__(self, accounts=None, engine=None, interval_minutes=None):
+        self.interval_minutes = PREFETCH_INTERVAL_MINUTES if interval_minutes is None else interval_minutes
+        if engine is None:
+            store = InsightsStore(refresh_minutes=max(REFRESH_MINUTES - self.interval_minutes, 0))
+            engine = FetchEngine(store=store)
+        self.engine = engine
+        self.accounts = accounts
+
+    def run_once(self, today=None):
+        """Sincroniza as janelas padrão; retorna (resumo, {(plataforma, conta): erro})"""
+        accounts = self.accounts if self.accounts is not None else configured_accounts()
+        windows = default_windows(today)
+        start_date = min(start for start, _ in windows.values())
+        end_date = max(end for _, end in windows.values())
+
+        started = time.perf_counter()
+        with timed('prefetch.sync') as span:
+            errors = self.engine.sync(accounts, start_date, end_date)
+            span.add(calls=len(accounts))
+        summary = {
+            'start_date': start_date,
+            'end_date': end_date,
+            'accounts': len(accounts),
+            'seconds': time.perf_counter() - started
+        }
+        return summary, errors
+
+    def run_forever(self, start_hour=None, end_hour=None):
+        """Executa a cada `interval_minutes` dentro do horário de trabalho; erros não interrompem o laço"""
+        while True:
+            wait = seconds_until_active(datetime.now(), start_hour, end_hour)
+            if wait:
+                print(f"Fora do horário de pré-carga; próxima execução em {wait / 3600:.1f} h", flush=True)
+                time.sleep(wait)
+                continue
+            try:
+                report(*self.run_once())
+            except Exception as e:
+                print(f"Erro na pré-carga: {str(e)}", flush=True)
+            time.sleep(self.interval_minutes * 60)
+
+
+def report(summary, errors):
+    print(f"Pré-carga concluída em {datetime.now():%Y-%m-%d %H:%M}: {summary['accounts']} contas sincronizadas "
+          f"de {summary['start_date']} a {summary['end_date']} em {summary['seconds']:.1f} s", flush=True)
+    for (platform, account_id), error in errors.items():
+        print(f"  Falha na conta {account_id} ({platform}): {str(error)}", flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pré-carrega no armazenamento local as janelas padrão do painel')
+    parser.add_argument('--daemon', action='store_true', help='Repete a cada --interval minutos dentro do horário de trabalho')
+    parser.add_argument('--interval', type=int, default=PREFETCH_INTERVAL_MINUTES, help='Minutos entre execuções')
+    parser.add_argument('--start-hour', type=int, default=PREFETCH_START_HOUR)
+    parser.add_argument('--end-hour', type=int, default=PREFETCH_END_HOUR)
+    args = parser.parse_args()
+
+    worker = PrefetchWorker(interval_minutes=args.interval)
+    if args.daemon:
+        worker.run_forever(args.start_hour, args.end_hour)
+    else:
+        # Execução única, para agendar via cron (ex.: "0 6 * * 1-5 python prefetch.py")
+        summary, errors = worker.run_once()
+        report(summary, errors)
+        sys.exit(1 if errors else 0)
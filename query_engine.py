@@ -0,0 +1,153 @@
+import pandas as pd
+from data_store import UPLOAD_ACCOUNT_PREFIX, InsightsStore, _to_date
+from instrumentation import timed
+from metrics_engine import ADDITIVE_COLUMNS, derive_metrics
+
+# Dimensões de agrupamento e a expressão SQL de cada uma (semana começa na segunda-feira)
+DIMENSIONS = {
+    'platform': 'platform',
+    'account_id': 'account_id',
+    'campaign_id': 'campaign_id',
+    'campaign_name': 'campaign_name',
+    'date': 'date',
+    'week': "date(date, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', date)"
+}
+DATE_DIMENSIONS = ('date', 'week', 'month')
+CAMPAIGN_DIMENSIONS = ('campaign_id', 'campaign_name')
+
+
+def _placeholders(values):
+    return ', '.join('?' for _ in values)
+
+
+def _with_ratios(df):
+    """CTR, CPC e CPM recalculados a partir das somas de cada grupo"""
+    df['ctr'] = (df['clicks'] / df['impressions'] * 100).where(df['impressions'] > 0, 0)
+    df['cpc'] = (df['spend'] / df['clicks']).where(df['clicks'] > 0, 0)
+    df['cpm'] = (df['spend'] / df['impressions'] * 1000).where(df['impressions'] > 0, 0)
+    return df
+
+
+class InsightsQuery:
+    """Consultas agregadas sobre o armazenamento local, com os filtros executados no próprio SQLite
+
+    Período, plataformas, contas e campanhas viram cláusulas WHERE sobre a chave primária
+    (plataforma, conta, data), e só o resultado agrupado de cada gráfico ou KPI chega ao pandas.
+    Sem dimensão ou filtro de campanha, a consulta lê as somas diárias por conta (daily_totals).
+    Sem `accounts`, os arquivos importados (contas upload-...) ficam de fora, a menos que
+    `include_uploads` seja verdadeiro.
+    """
+
+    def __init__(self, store=None):
+        self.store = store if store is not None else InsightsStore()
+
+    def _where(self, start_date, end_date, accounts=None, platforms=None, campaigns=None, search=None,
+               include_uploads=False):
+        period = [_to_date(start_date).isoformat(), _to_date(end_date).isoformat()]
+        clauses = []
+        params = []
+
+        if accounts is not None:
+            by_platform = {}
+            for platform, account_id in accounts:
+                by_platform.setdefault(platform, []).append(str(account_id))
+            if not by_platform:
+                clauses.append('0')
+            else:
+                # O período entra em cada termo para que o SQLite percorra só a faixa
+                # (plataforma, conta, data) da chave primária de cada conta
+                terms = []
+                for platform, account_ids in by_platform.items():
+                    terms.append(f"(platform = ? AND account_id IN ({_placeholders(account_ids)}) AND date BETWEEN ? AND ?)")
+                    params += [platform] + account_ids + period
+                clauses.append(f"({' OR '.join(terms)})")
+        else:
+            clauses.append('date BETWEEN ? AND ?')
+            params += period
+            if not include_uploads:
+                clauses.append('account_id NOT LIKE ?')
+                params.append(f"{UPLOAD_ACCOUNT_PREFIX}%")
+
+        if platforms:
+            clauses.append(f"platform IN ({_placeholders(platforms)})")
+            params += list(platforms)
+
+        if campaigns is not None:
+            campaigns = [str(campaign) for campaign in campaigns]
+            if not campaigns:
+                clauses.append('0')
+            else:
+                # Ids ou nomes, como no cubo de métricas
+                clauses.append(f"(campaign_id IN ({_placeholders(campaigns)}) OR campaign_name IN ({_placeholders(campaigns)}))")
+                params += campaigns + campaigns
+
+        if search:
+            escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            clauses.append("campaign_name LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+
+        return ' AND '.join(clauses), params
+
+    def aggregate(self, start_date, end_date, dimensions=(), accounts=None, platforms=None, campaigns=None,
+                  search=None, order_by=None, limit=None, include_uploads=False):
+        """Somas das métricas aditivas por `dimensions`, com CTR/CPC/CPM recalculados por grupo
+
+        `accounts` é uma lista de (plataforma, id da conta); `campaigns`, ids ou nomes exatos;
+        `search`, um trecho do nome da campanha. `order_by` ordena de forma decrescente por uma
+        métrica (com `limit` opcional); sem ele, o resultado segue a ordem das dimensões.
+        """
+        invalid = [dimension for dimension in dimensions if dimension not in DIMENSIONS]
+        if invalid:
+            raise ValueError(f"Dimensões inválidas: {invalid}. Use {list(DIMENSIONS)}")
+        if order_by is not None and order_by not in ADDITIVE_COLUMNS:
+            raise ValueError(f"Ordenação inválida: {order_by}. Use uma de {ADDITIVE_COLUMNS}")
+
+        where, params = self._where(start_date, end_date, accounts, platforms, campaigns, search, include_uploads)
+        select = [f"{DIMENSIONS[dimension]} AS {dimension}" for dimension in dimensions]
+        select += [f"SUM({column}) AS {column}" for column in ADDITIVE_COLUMNS]
+        campaign_level = campaigns is not None or search or any(dimension in CAMPAIGN_DIMENSIONS for dimension in dimensions)
+        table = 'insights' if campaign_level else 'daily_totals'
+        sql = f"SELECT {', '.join(select)} FROM {table} WHERE {where}"
+        if dimensions:
+            sql += f" GROUP BY {', '.join(dimensions)}"
+        if order_by:
+            sql += f" ORDER BY {order_by} DESC"
+        elif dimensions:
+            sql += f" ORDER BY {', '.join(dimensions)}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with timed(f"query.{'_'.join(dimensions) or 'totals'}") as span:
+            with self.store._connect() as conn:
+                df = pd.read_sql_query(sql, conn, params=params)
+            span.add(rows=len(df))
+
+        if not dimensions and df['spend'].isna().all():
+            # SUM sem linhas retorna NULL
+            df = df.iloc[0:0]
+        df[ADDITIVE_COLUMNS] = df[ADDITIVE_COLUMNS].fillna(0)
+        for dimension in dimensions:
+            if dimension in DATE_DIMENSIONS:
+                # Os gráficos trabalham com datetime
+                df[dimension] = pd.to_datetime(df[dimension])
+            elif dimension in ('platform', 'campaign_name'):
+                df[dimension] = df[dimension].astype('category')
+        return _with_ratios(df)
+
+    def totals(self, start_date, end_date, accounts=None, platforms=None, campaigns=None, search=None,
+               include_uploads=False):
+        """KPIs consolidados (mesmas chaves de `calculate_metrics`) ou None se não houver dados"""
+        df = self.aggregate(start_date, end_date, accounts=accounts, platforms=platforms, campaigns=campaigns, search=search,
+                            include_uploads=include_uploads)
+        if df.empty:
+            return None
+        return derive_metrics({column: float(df[column].iloc[0]) for column in ADDITIVE_COLUMNS})
+
+    def campaign_names(self, start_date, end_date, accounts=None, platforms=None, search=None, limit=None,
+                       include_uploads=False):
+        """Nomes das campanhas com dados no período, dos que mais investiram para os que menos"""
+        df = self.aggregate(start_date, end_date, ('campaign_name',), accounts=accounts, platforms=platforms,
+                            search=search, order_by='spend', limit=limit, include_uploads=include_uploads)
+        return df['campaign_name'].astype(str).tolist()
@@ -0,0 +1,106 @@
+import atexit
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import plotly.io as pio
+from dotenv import load_dotenv
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+from instrumentation import timed
+from utils import format_currency, format_number
+
+load_dotenv()
+
+# Processos que rasterizam os gráficos; cada um mantém seu próprio motor do Kaleido aberto
+RENDER_WORKERS = int(os.getenv('REPORT_RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+IMAGE_WIDTH = 1000
+IMAGE_HEIGHT = 500
+IMAGE_SCALE = 2
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _warm_engine():
+    """Inicializa o Kaleido no processo: a primeira exportação é a que sobe o navegador"""
+    pio.to_image({'data': [], 'layout': {}}, format='png', width=10, height=10)
+
+
+def _rasterize(figure):
+    return pio.to_image(figure, format='png', width=IMAGE_WIDTH, height=IMAGE_HEIGHT, scale=IMAGE_SCALE, validate=False)
+
+
+def get_pool():
+    """Pool de processos reaproveitado entre exportações, com o motor de imagens já aquecido"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: o processo do Streamlit tem várias threads e não deve ser duplicado com fork
+            _pool = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_warm_engine
+            )
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def render_images(figures):
+    """Rasteriza as figuras Plotly em PNG (bytes), em paralelo quando há mais de um processo"""
+    specs = [figure.to_plotly_json() if hasattr(figure, 'to_plotly_json') else figure for figure in figures]
+    if not specs:
+        return []
+    with timed('pdf.rasterize') as span:
+        if RENDER_WORKERS <= 1 or len(specs) == 1 and _pool is None:
+            images = [_rasterize(spec) for spec in specs]
+        else:
+            images = list(get_pool().map(_rasterize, specs))
+        span.add(rows=len(images), bytes=sum(len(image) for image in images))
+    return images
+
+
+def build_pdf(metrics, images):
+    """Monta o PDF do relatório com as métricas principais e uma página por imagem"""
+    pdf = FPDF()
+    pdf.add_page()
+
+    # Adicionar título
+    pdf.set_font('Helvetica', 'B', 16)
+    pdf.cell(0, 10, 'Relatório de Performance de Anúncios', align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    # Adicionar métricas principais
+    pdf.set_font('Helvetica', '', 12)
+    for line in [
+        f"Período: {metrics['period']}",
+        f"Investimento Total: {format_currency(metrics['total_spend'])}",
+        f"Total de Cliques: {format_number(metrics['total_clicks'])}",
+        f"Total de Conversões: {format_number(metrics['total_conversions'])}"
+    ]:
+        pdf.cell(0, 10, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    # Adicionar gráficos direto da memória
+    for image in images:
+        pdf.add_page()
+        pdf.image(io.BytesIO(image), x=10, y=10, w=190)
+
+    with timed('pdf.build') as span:
+        content = bytes(pdf.output())
+        span.add(bytes=len(content))
+    return content
+
+
+def render_pdf(figures, metrics):
+    """Exporta o dashboard para PDF sem arquivos temporários"""
+    return build_pdf(metrics, render_images(figures))
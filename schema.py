@@ -0,0 +1,239 @@
+import pandas as pd
+import pyarrow as pa
+from locale_numbers import parse_locale_columns
+
+# Datas sem horário em 4 bytes por linha (datetime64 usa 8)
+DATE_DTYPE = pd.ArrowDtype(pa.date32())
+
+# Esquema canônico compartilhado por API, CSV e XLSX: coluna -> dtype
+CANONICAL_DTYPES = {
+    'platform': 'category',
+    'account_id': 'category',
+    'date': DATE_DTYPE,
+    'hour': 'int8',
+    'campaign_id': 'category',
+    'campaign_name': 'category',
+    'device': 'category',
+    'placement': 'category',
+    'ad_group': 'category',
+    'spend': 'float32',
+    # Impressões e alcance somados por conta/ano podem passar de 2^31
+    'impressions': 'int64',
+    'clicks': 'int32',
+    'conversions': 'float32',
+    'reach': 'int64',
+    # Conversões por tipo e visualizações de vídeo (25/50/75/100%) vindas da API do Facebook
+    'purchases': 'float32',
+    'video_p25': 'int32',
+    'video_p50': 'int32',
+    'video_p75': 'int32',
+    'video_p100': 'int32',
+    'ctr': 'float32',
+    'cpc': 'float32',
+    'cpm': 'float32'
+}
+METRIC_COLUMNS = ['spend', 'impressions', 'clicks', 'conversions', 'reach', 'purchases',
+                  'video_p25', 'video_p50', 'video_p75', 'video_p100', 'ctr', 'cpc', 'cpm']
+
+# Origens conhecidas: colunas de origem -> canônicas, separador decimal e colunas obrigatórias
+SOURCES = {
+    'facebook_api': {
+        'platform': 'Facebook',
+        'columns': {},
+        'decimal': '.',
+        'required': ['campaign_name']
+    },
+    'google_api': {
+        'platform': 'Google',
+        'columns': {},
+        'decimal': '.',
+        'required': ['campaign_name']
+    },
+    'facebook_csv_pt': {
+        'platform': 'Facebook',
+        'columns': {
+            "Nome da campanha": "campaign_name",
+            "Início dos relatórios": "date",
+            "Dia": "date",
+            "Valor usado (BRL)": "spend",
+            "Impressões": "impressions",
+            "Cliques no link": "clicks",
+            "CTR (taxa de cliques no link)": "ctr",
+            "CPC (custo por clique no link)": "cpc",
+            "CPM (custo por 1.000 impressões)": "cpm",
+            "Alcance": "reach",
+            "Resultados": "conversions"
+        },
+        'decimal': ',',
+        'percent_columns': ['ctr'],
+        'reach_from_impressions': True,
+        'required': ["Nome da campanha", "Valor usado (BRL)", "Impressões", "Cliques no link"]
+    },
+    'facebook_csv_en': {
+        'platform': 'Facebook',
+        'columns': {
+            "Campaign name": "campaign_name",
+            "Reporting starts": "date",
+            "Day": "date",
+            "Amount spent (BRL)": "spend",
+            "Impressions": "impressions",
+            "Link clicks": "clicks",
+            "CTR (Link click-through rate)": "ctr",
+            "CPC (Cost per link click)": "cpc",
+            "CPM (Cost per 1,000 impressions)": "cpm",
+            "Reach": "reach",
+            "Results": "conversions"
+        },
+        'decimal': '.',
+        'percent_columns': ['ctr'],
+        'reach_from_impressions': True,
+        'required': ["Campaign name", "Amount spent (BRL)", "Impressions", "Link clicks"]
+    },
+    # Layout simplificado, já com os nomes canônicos
+    'facebook_csv': {
+        'platform': 'Facebook',
+        'columns': {},
+        'decimal': '.',
+        'required': ['campaign_name', 'spend', 'impressions', 'clicks', 'ctr', 'cpc', 'cpm', 'reach']
+    },
+    'google_csv_pt': {
+        'platform': 'Google',
+        'columns': {
+            "Campanha": "campaign_name",
+            "Dia": "date",
+            "Custo": "spend",
+            "Impr.": "impressions",
+            "Cliques": "clicks",
+            "CTR": "ctr",
+            "CPC méd.": "cpc",
+            "CPM méd.": "cpm",
+            "Conversões": "conversions"
+        },
+        'decimal': ',',
+        'percent_columns': ['ctr'],
+        'reach_from_impressions': True,
+        'required': ["Campanha", "Custo", "Impr.", "Cliques"]
+    },
+    'google_csv_en': {
+        'platform': 'Google',
+        'columns': {
+            "Campaign": "campaign_name",
+            "Day": "date",
+            "Cost": "spend",
+            "Impr.": "impressions",
+            "Clicks": "clicks",
+            "CTR": "ctr",
+            "Avg. CPC": "cpc",
+            "Avg. CPM": "cpm",
+            "Conversions": "conversions"
+        },
+        'decimal': '.',
+        'percent_columns': ['ctr'],
+        'reach_from_impressions': True,
+        'required': ["Campaign", "Cost", "Impr.", "Clicks"]
+    },
+    # Layout simplificado aceito por process_google_csv
+    'google_csv': {
+        'platform': 'Google',
+        'columns': {
+            'cost': 'spend',
+            'avg_cpc': 'cpc',
+            'avg_cpm': 'cpm'
+        },
+        'decimal': '.',
+        'reach_from_impressions': True,
+        'required': ['campaign_name', 'cost', 'impressions', 'clicks', 'ctr', 'avg_cpc', 'avg_cpm']
+    }
+}
+FILE_SOURCES = [name for name in SOURCES if not name.endswith('_api')]
+
+
+def detect_source(columns, platform=None):
+    """Identifica a origem de um arquivo pelas colunas do cabeçalho; retorna None se nenhuma servir"""
+    header = {str(column).strip() for column in columns}
+    for name in FILE_SOURCES:
+        spec = SOURCES[name]
+        if platform and spec['platform'] != platform:
+            continue
+        if all(column in header for column in spec['required']):
+            return name
+    return None
+
+
+def source_columns(columns, source, wanted=None):
+    """Mapeia {coluna do arquivo: coluna canônica}, opcionalmente só para as canônicas em `wanted`"""
+    mapping = SOURCES[source]['columns']
+    resolved = {}
+    for column in columns:
+        name = str(column).strip()
+        canonical = mapping.get(name, name if name in CANONICAL_DTYPES else None)
+        if canonical and canonical not in resolved.values() and (wanted is None or canonical in wanted):
+            resolved[column] = canonical
+    return resolved
+
+
+def to_date32(series):
+    if series.dtype == DATE_DTYPE:
+        return series
+    return pd.to_datetime(series).astype(DATE_DTYPE)
+
+
+def compact(df):
+    """Converte as colunas canônicas presentes para os dtypes compactos; demais colunas são mantidas"""
+    for column, dtype in CANONICAL_DTYPES.items():
+        if column not in df.columns:
+            continue
+        if column == 'date':
+            df[column] = to_date32(df[column])
+        elif dtype == 'category':
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(str).astype('category')
+        else:
+            df[column] = df[column].fillna(0).astype(dtype)
+    return df
+
+
+def normalize(df, source, account_id=None, dayfirst=None, compact_dtypes=True):
+    """Converte um DataFrame de qualquer origem conhecida para o esquema canônico compacto
+
+    O número de células que não puderam ser convertidas fica em `df.attrs['parse_failures']`.
+    Com `compact_dtypes=False` os valores ficam em float64/datetime64, para gravação no
+    armazenamento local sem o ruído do float32 (35.93 viraria 35.9300003051758).
+    """
+    spec = SOURCES[source]
+    df = df.rename(columns=source_columns(df.columns, source))
+    df = df.loc[:, [column for column in CANONICAL_DTYPES if column in df.columns]]
+    df = df.dropna(subset=['campaign_name'])
+
+    failures = parse_locale_columns(
+        df,
+        [column for column in METRIC_COLUMNS if column in df.columns],
+        decimal=spec['decimal'],
+        percent_columns=spec.get('percent_columns', ())
+    )
+
+    if 'conversions' not in df.columns:
+        df['conversions'] = 0
+    if 'reach' not in df.columns and spec.get('reach_from_impressions'):
+        # Usa impressões como aproximação do alcance
+        df['reach'] = df['impressions']
+
+    if 'date' in df.columns:
+        if dayfirst is None:
+            dayfirst = spec['decimal'] == ','
+        df['date'] = pd.to_datetime(df['date'], dayfirst=dayfirst, errors='coerce')
+        invalid_dates = int(df['date'].isna().sum())
+        if invalid_dates:
+            failures['date'] = invalid_dates
+            df = df.dropna(subset=['date'])
+
+    df['platform'] = spec['platform']
+    if account_id is not None:
+        df['account_id'] = str(account_id)
+    if 'campaign_id' not in df.columns:
+        df['campaign_id'] = df['campaign_name']
+
+    if compact_dtypes:
+        df = compact(df)
+    df.attrs['parse_failures'] = failures
+    return df.reset_index(drop=True)
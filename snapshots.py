@@ -0,0 +1,132 @@
+import hashlib
+import os
+import threading
+import time
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from dotenv import load_dotenv
+from instrumentation import count, timed
+
+load_dotenv()
+
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join('data', 'snapshots'))
+# Idade máxima de um snapshot antes de os dados serem buscados de novo (cache do dashboard);
+# CACHE_TTL_SECONDS e CACHE_MAX_ENTRIES são os nomes antigos, ainda aceitos
+SNAPSHOT_TTL_SECONDS = int(os.getenv('SNAPSHOT_TTL_SECONDS', os.getenv('CACHE_TTL_SECONDS', 900)))
+SNAPSHOT_MAX_ENTRIES = int(os.getenv('SNAPSHOT_MAX_ENTRIES', os.getenv('CACHE_MAX_ENTRIES', 64)))
+SUFFIX = '.arrow'
+
+
+def insights_key(accounts, start_date, end_date, granularity=None, breakdowns=()):
+    """Nome do snapshot de uma busca do FetchEngine; o mesmo para o painel e para os relatórios em lote"""
+    accounts = tuple((platform, str(account_id)) for platform, account_id in accounts)
+    parts = ('insights', accounts, str(start_date), str(end_date), granularity, tuple(breakdowns))
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:24]
+
+
+class SnapshotStore:
+    """Snapshots Arrow IPC dos dados normalizados, compartilhados entre sessões e processos
+
+    Cada conjunto de dados é gravado uma única vez como `<nome>.<versão>.arrow`: o arquivo
+    é escrito com outro nome e renomeado de forma atômica, então leitores nunca veem uma
+    gravação parcial. A leitura usa memory map e as colunas numéricas do DataFrame apontam
+    direto para as páginas do arquivo, que o sistema operacional compartilha entre todas as
+    sessões e processos: a memória cresce com os conjuntos distintos, não com os usuários.
+    Os arrays lidos são somente leitura; substitua colunas em vez de alterá-las no lugar.
+    """
+
+    def __init__(self, root=None, max_entries=None):
+        self.root = root or SNAPSHOT_DIR
+        self.max_entries = max_entries or SNAPSHOT_MAX_ENTRIES
+        os.makedirs(self.root, exist_ok=True)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _snapshots(self):
+        """{nome: [(versão, caminho)] da mais nova para a mais antiga}; temporários ficam de fora"""
+        snapshots = {}
+        for entry in os.scandir(self.root):
+            name, _, version = entry.name[:-len(SUFFIX)].rpartition('.')
+            if entry.name.endswith(SUFFIX) and name and version.isdigit():
+                snapshots.setdefault(name, []).append((int(version), entry.path))
+        for versions in snapshots.values():
+            versions.sort(reverse=True)
+        return snapshots
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                # Ainda mapeado por um leitor (Windows) ou já removido; sai na próxima limpeza
+                pass
+
+    def write(self, name, df):
+        """Grava uma nova versão do conjunto e descarta as anteriores; retorna o caminho"""
+        path = os.path.join(self.root, f"{name}.{time.time_ns()}{SUFFIX}")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with timed('snapshot.write') as span:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # Sem compressão: só arquivos descompactados podem ser mapeados sem cópia
+            with pa.OSFile(temp_path, 'wb') as sink:
+                with ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(temp_path, path)
+            span.add(rows=table.num_rows, bytes=os.path.getsize(path))
+        self.prune()
+        return path
+
+    def prune(self):
+        """Remove versões substituídas e, acima de `max_entries` conjuntos, os gravados há mais tempo"""
+        snapshots = self._snapshots()
+        stale = [path for versions in snapshots.values() for _, path in versions[1:]]
+        by_age = sorted(snapshots, key=lambda name: snapshots[name][0][0], reverse=True)
+        stale += [path for name in by_age[self.max_entries:] for _, path in snapshots[name]]
+        self._remove(stale)
+
+    def read(self, name, max_age=None):
+        """DataFrame da versão mais recente, ou None se não houver ou se tiver mais de `max_age` segundos"""
+        for _ in range(3):
+            versions = self._snapshots().get(name)
+            if not versions:
+                return None
+            version, path = versions[0]
+            if max_age is not None and time.time_ns() - version > max_age * 1e9:
+                return None
+            try:
+                source = pa.memory_map(path, 'r')
+            except FileNotFoundError:
+                # Substituída por uma versão nova entre a listagem e a abertura; lista de novo
+                continue
+            table = ipc.open_file(source).read_all()
+            # split_blocks: cada coluna numérica vira um array sobre o arquivo mapeado, sem cópia
+            return table.to_pandas(split_blocks=True)
+        return None
+
+    def _name_lock(self, name):
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def get_or_create(self, name, build, max_age=None, cacheable=None):
+        """Lê o snapshot `name` ou, se ausente ou vencido, gera com `build()` (uma vez por processo)
+
+        Se `cacheable(df)` for falso (ex.: contas que falharam), o resultado é devolvido sem ser gravado.
+        """
+        df = self.read(name, max_age)
+        if df is None:
+            with self._name_lock(name):
+                # Outra sessão pode ter gerado o snapshot enquanto esperávamos
+                df = self.read(name, max_age)
+                if df is None:
+                    count('snapshot', cache_misses=1)
+                    df = build()
+                    if cacheable is not None and not cacheable(df):
+                        return df
+                    self.write(name, df)
+                    return self.read(name)
+        count('snapshot', cache_hits=1)
+        return df
+
+    def clear(self):
+        """Descarta todos os snapshots; as próximas leituras buscam os dados de novo"""
+        self._remove(path for versions in self._snapshots().values() for _, path in versions)
@@ -0,0 +1,353 @@
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from dotenv import load_dotenv
+from instrumentation import count, timed
+
+load_dotenv()
+
+# Tentativas por requisição (página) e espera exponencial entre elas
+MAX_RETRIES = int(os.getenv('FETCH_MAX_RETRIES', 5))
+BACKOFF_BASE_SECONDS = float(os.getenv('FETCH_BACKOFF_BASE_SECONDS', 2))
+BACKOFF_MAX_SECONDS = float(os.getenv('FETCH_BACKOFF_MAX_SECONDS', 60))
+
+# Conexões HTTP mantidas abertas por sessão do Facebook e tempo limite de cada requisição
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 16))
+HTTP_TIMEOUT_SECONDS = float(os.getenv('HTTP_TIMEOUT_SECONDS', 120))
+# Uso (%) informado nos cabeçalhos do Facebook a partir do qual as requisições são espaçadas
+FACEBOOK_USAGE_SLOWDOWN_PCT = float(os.getenv('FACEBOOK_USAGE_SLOWDOWN_PCT', 75))
+
+# Falhas transitórias seguidas que abrem o circuito de uma conta e tempo até a nova tentativa
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_SECONDS = float(os.getenv('CIRCUIT_RESET_SECONDS', 60))
+
+# Códigos de erro de limite de requisições da Marketing API (app, conta e business use case)
+FACEBOOK_RATE_LIMIT_CODES = {4, 17, 32, 613} | set(range(80000, 80015))
+TRANSIENT_HTTP_STATUSES = {429, 500, 502, 503, 504}
+TRANSIENT_GRPC_CODES = {'RESOURCE_EXHAUSTED', 'UNAVAILABLE', 'DEADLINE_EXCEEDED', 'INTERNAL', 'ABORTED'}
+
+
+class CircuitOpenError(RuntimeError):
+    """Chamada recusada porque o circuito da conta está aberto"""
+
+
+class CircuitBreaker:
+    """Suspende as chamadas de uma conta após falhas transitórias seguidas
+
+    Fechado: chamadas normais. Aberto: falha imediata com CircuitOpenError até o fim da espera.
+    Meio aberto: uma única chamada de teste; sucesso fecha o circuito e falha o reabre.
+    """
+
+    def __init__(self, name, failure_threshold=None, reset_seconds=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or CIRCUIT_FAILURE_THRESHOLD
+        self.reset_seconds = CIRCUIT_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self.failures = 0
+        self.opened_until = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if not self.opened_until:
+            return 'closed'
+        return 'open' if time.monotonic() < self.opened_until else 'half_open'
+
+    def before_call(self):
+        with self._lock:
+            if not self.opened_until:
+                return
+            remaining = self.opened_until - time.monotonic()
+            if remaining > 0 or self._trial:
+                raise CircuitOpenError(
+                    f"Chamadas para {self.name} suspensas após {self.failures} falhas seguidas; "
+                    f"nova tentativa em {max(remaining, 0):.0f}s"
+                )
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_until = 0.0
+            self._trial = False
+
+    def record_failure(self, open_seconds=None):
+        """Conta uma falha transitória e retorna True se o circuito abriu
+
+        `open_seconds` abre o circuito imediatamente por esse tempo.
+        """
+        with self._lock:
+            self.failures += 1
+            reopen = self._trial
+            self._trial = False
+            if not (open_seconds or reopen or self.failures >= self.failure_threshold):
+                return False
+            self.opened_until = time.monotonic() + max(open_seconds or 0, self.reset_seconds)
+        count('transport.circuit_open', self.name, errors=1)
+        return True
+
+
+_breakers = {}
+_pool_lock = threading.Lock()
+
+
+def circuit_breaker(name):
+    """Circuito compartilhado por todas as chamadas de uma conta ("Plataforma:conta")"""
+    with _pool_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def _is_sdk_error(error, module, name):
+    """isinstance contra uma classe de SDK sem importá-lo: se o SDK não foi carregado, o erro não é dele"""
+    error_class = getattr(sys.modules.get(module), name, None)
+    return error_class is not None and isinstance(error, error_class)
+
+
+def is_rate_limit_error(error):
+    """Indica se o erro retornado pela API é de limite de requisições (e pode ser repetido mais tarde)"""
+    if _is_sdk_error(error, 'facebook_business.exceptions', 'FacebookRequestError'):
+        return error.http_status() == 429 or error.api_error_code() in FACEBOOK_RATE_LIMIT_CODES
+    if _is_sdk_error(error, 'google.ads.googleads.errors', 'GoogleAdsException'):
+        if error.error.code().name == 'RESOURCE_EXHAUSTED':
+            return True
+        return any('quota_error' in error_item.error_code for error_item in error.failure.errors)
+    return False
+
+
+def is_transient_error(error):
+    """Falhas que tendem a passar sozinhas: limites de requisição, erros 5xx, rede e circuito aberto"""
+    if isinstance(error, CircuitOpenError) or is_rate_limit_error(error):
+        return True
+    if _is_sdk_error(error, 'facebook_business.exceptions', 'FacebookRequestError'):
+        return error.http_status() in TRANSIENT_HTTP_STATUSES or bool(error.api_transient_error())
+    if _is_sdk_error(error, 'google.ads.googleads.errors', 'GoogleAdsException'):
+        return error.error.code().name in TRANSIENT_GRPC_CODES
+    if _is_sdk_error(error, 'grpc', 'RpcError') and hasattr(error, 'code'):
+        return error.code().name in TRANSIENT_GRPC_CODES
+    return _is_sdk_error(error, 'requests', 'ConnectionError') or _is_sdk_error(error, 'requests', 'Timeout')
+
+
+def _header_json(headers, name):
+    try:
+        return json.loads(headers.get(name) or 'null')
+    except ValueError:
+        return None
+
+
+def facebook_usage(headers):
+    """Maior uso (%) e espera sugerida (s) dos cabeçalhos de limite do Facebook
+
+    Lê x-app-usage, x-ad-account-usage, x-business-use-case-usage e Retry-After.
+    """
+    headers = {str(name).lower(): value for name, value in (headers or {}).items()}
+    usage_fields = ('call_count', 'total_time', 'total_cputime')
+    usage, wait = 0, 0
+
+    app = _header_json(headers, 'x-app-usage') or {}
+    usage = max([usage] + [app.get(field, 0) for field in usage_fields])
+
+    account = _header_json(headers, 'x-ad-account-usage') or {}
+    usage = max(usage, account.get('acc_id_util_pct', 0))
+    wait = max(wait, account.get('reset_time_duration', 0))
+
+    business = _header_json(headers, 'x-business-use-case-usage') or {}
+    for entries in business.values():
+        for entry in entries:
+            usage = max([usage] + [entry.get(field, 0) for field in usage_fields])
+            # Estimativa em minutos
+            wait = max(wait, (entry.get('estimated_time_to_regain_access') or 0) * 60)
+
+    try:
+        wait = max(wait, float(headers.get('retry-after') or 0))
+    except ValueError:
+        pass
+    return usage, wait
+
+
+def _duration_seconds(value):
+    # proto-plus converte Duration em timedelta; o protobuf cru mantém seconds/nanos
+    if hasattr(value, 'total_seconds'):
+        return value.total_seconds()
+    return value.seconds + value.nanos / 1e9
+
+
+def retry_after(error):
+    """Espera (s) pedida pela plataforma para repetir a chamada, se informada"""
+    if _is_sdk_error(error, 'facebook_business.exceptions', 'FacebookRequestError'):
+        # Os cabeçalhos de uso trazem o tempo até zerar a cota mesmo sem bloqueio; só vale para limite
+        return (facebook_usage(error.http_headers())[1] or None) if is_rate_limit_error(error) else None
+    if _is_sdk_error(error, 'google.ads.googleads.errors', 'GoogleAdsException'):
+        delays = [_duration_seconds(item.details.quota_error_details.retry_delay) for item in error.failure.errors]
+        return max(delays, default=0) or None
+    return None
+
+
+def backoff_delay(attempt, minimum=None):
+    """Espera exponencial com jitter, nunca menor que a espera pedida pela plataforma"""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1)
+    return max(delay, minimum or 0)
+
+
+def _after_failure(error, breaker, attempt, max_retries, retryable=None):
+    """Decide se a chamada que falhou será repetida: espera o backoff ou propaga o erro"""
+    if not is_transient_error(error):
+        # A plataforma respondeu: o erro é da requisição, não sinal de instabilidade
+        breaker.record_success()
+        raise error
+    if retryable is not None and not retryable(error):
+        # Falha transitória, mas a requisição pode ter sido processada: repetir poderia duplicá-la
+        breaker.record_failure()
+        raise error
+    wait = retry_after(error)
+    if attempt >= max_retries or (wait and wait > BACKOFF_MAX_SECONDS):
+        # Espera longa demais (ex.: conta bloqueada por 30 min): abre o circuito em vez de prender a thread
+        breaker.record_failure(wait if wait and wait > BACKOFF_MAX_SECONDS else None)
+        raise error
+    if breaker.record_failure():
+        raise error
+    count('transport.retry', breaker.name, retries=1)
+    time.sleep(backoff_delay(attempt, wait))
+
+
+def call_with_retry(func, name, max_retries=None, retryable=None):
+    """Executa `func()` repetindo falhas transitórias com backoff, dentro do circuito da conta `name`
+
+    `retryable(erro)`, se informado, restringe quais falhas transitórias podem ser repetidas.
+    """
+    max_retries = MAX_RETRIES if max_retries is None else max_retries
+    breaker = circuit_breaker(name)
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = func()
+        except Exception as e:
+            _after_failure(e, breaker, attempt, max_retries, retryable)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+def resume_stream(open_stream, name, max_retries=None):
+    """Percorre um stream de DataFrames reabrindo-o após falhas transitórias
+
+    `open_stream(linhas_entregues)` deve recomeçar a leitura depois das linhas já entregues
+    (ex.: consulta ordenada descartando o início), para que uma falha não repita o stream todo.
+    """
+    max_retries = MAX_RETRIES if max_retries is None else max_retries
+    breaker = circuit_breaker(name)
+    delivered = 0
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            for df in open_stream(delivered):
+                delivered += len(df)
+                attempt = 0
+                breaker.record_success()
+                yield df
+        except Exception as e:
+            _after_failure(e, breaker, attempt, max_retries)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return
+
+
+def facebook_pause(headers):
+    """Pausa (s) antes da próxima requisição quando o uso informado se aproxima do limite"""
+    usage = facebook_usage(headers)[0]
+    if usage < FACEBOOK_USAGE_SLOWDOWN_PCT:
+        return 0
+    # Cresce linearmente até 10x o backoff base com 100% de uso
+    fraction = min(1, (usage - FACEBOOK_USAGE_SLOWDOWN_PCT) / max(100 - FACEBOOK_USAGE_SLOWDOWN_PCT, 1))
+    return min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 10 * fraction)
+
+
+@functools.lru_cache(maxsize=None)
+def _resilient_facebook_api_class():
+    # Definida sob demanda para não importar o SDK do Facebook junto com este módulo
+    from facebook_business.api import FacebookAdsApi
+
+    class ResilientFacebookAdsApi(FacebookAdsApi):
+        """FacebookAdsApi que repete cada requisição (uma página de resultados) em falhas transitórias
+        e espaça as chamadas conforme os cabeçalhos de uso
+
+        Só leituras (GET) são repetidas em qualquer falha transitória. POSTs, como a criação de um
+        relatório assíncrono, só em erros de limite de requisições, em que o Facebook recusou a
+        chamada: um timeout depois de o job ser aceito criaria relatórios duplicados.
+        `bytes_received` acumula o tamanho dos corpos das respostas (JSON da Graph API).
+        """
+
+        def __init__(self, session, name, api_version=None):
+            super().__init__(session, api_version)
+            self.name = name
+            self.bytes_received = 0
+
+        def call(self, method, *args, **kwargs):
+            retryable = None if str(method).upper() == 'GET' else is_rate_limit_error
+            response = call_with_retry(lambda: FacebookAdsApi.call(self, method, *args, **kwargs), self.name,
+                                       retryable=retryable)
+            self.bytes_received += len(response.body() or '')
+            pause = facebook_pause(response.headers())
+            if pause:
+                with timed('transport.throttle', self.name):
+                    time.sleep(pause)
+            return response
+
+    return ResilientFacebookAdsApi
+
+
+_facebook_sessions = {}
+_google_clients = {}
+_google_services = {}
+
+
+def facebook_session(app_id, app_secret, access_token):
+    """Sessão HTTP compartilhada pelas contas com as mesmas credenciais (conexões reaproveitadas)"""
+    from facebook_business.session import FacebookSession
+    from requests.adapters import HTTPAdapter
+    key = (app_id, app_secret, access_token)
+    with _pool_lock:
+        if key not in _facebook_sessions:
+            session = FacebookSession(app_id, app_secret, access_token, timeout=HTTP_TIMEOUT_SECONDS)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+            session.requests.mount('https://', adapter)
+            _facebook_sessions[key] = session
+        return _facebook_sessions[key]
+
+
+def facebook_api(app_id, app_secret, access_token, name):
+    """API da conta `name` sobre a sessão compartilhada; também passa a ser a API padrão do SDK"""
+    from facebook_business.api import FacebookAdsApi
+    api = _resilient_facebook_api_class()(facebook_session(app_id, app_secret, access_token), name)
+    # Na classe base: é onde o SDK procura a API padrão
+    FacebookAdsApi.set_default_api(api)
+    return api
+
+
+def google_ads_client(config):
+    """Cliente do Google Ads compartilhado pelas contas com a mesma configuração"""
+    from google.ads.googleads.client import GoogleAdsClient
+    key = tuple(sorted(config.items()))
+    with _pool_lock:
+        if key not in _google_clients:
+            _google_clients[key] = GoogleAdsClient.load_from_dict(dict(config))
+        return _google_clients[key]
+
+
+def google_service(client, name):
+    """Serviço do cliente criado uma única vez: cada get_service abre um novo canal gRPC"""
+    key = (id(client), name)
+    with _pool_lock:
+        if key not in _google_services:
+            # Guarda o cliente junto para que o id não seja reaproveitado por outro objeto
+            _google_services[key] = (client, client.get_service(name))
+        return _google_services[key][1]
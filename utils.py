@@ -1,30 +1,22 @@
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import streamlit as st
-from fpdf import FPDF
 import io
+from instrumentation import instrumented
+from chart_data import fold_long_tail, prepare_line_data, use_webgl
+from metrics_engine import derive_metrics, sum_columns
 
+@instrumented('metrics')
 def calculate_metrics(df):
-    """Calcula métricas adicionais a partir dos dados brutos"""
-    metrics = {
-        'total_spend': df['spend'].sum(),
-        'total_impressions': df['impressions'].sum(),
-        'total_clicks': df['clicks'].sum(),
-        'total_conversions': df['conversions'].sum() if 'conversions' in df.columns else 0,
-        'avg_ctr': (df['clicks'].sum() / df['impressions'].sum() * 100) if df['impressions'].sum() > 0 else 0,
-        'avg_cpc': df['spend'].sum() / df['clicks'].sum() if df['clicks'].sum() > 0 else 0,
-        'avg_cpm': df['spend'].sum() / (df['impressions'].sum() / 1000) if df['impressions'].sum() > 0 else 0,
-        'conversion_rate': (df['conversions'].sum() / df['clicks'].sum() * 100) if 'conversions' in df.columns and df['clicks'].sum() > 0 else 0,
-        'cpa': df['spend'].sum() / df['conversions'].sum() if 'conversions' in df.columns and df['conversions'].sum() > 0 else 0
-    }
-    return metrics
+    """Calcula métricas adicionais a partir dos dados brutos (uma única soma por coluna)"""
+    return derive_metrics(sum_columns(df))
 
+@instrumented('chart.performance')
 def create_performance_chart(df, metric):
     """Cria gráfico de linha para métricas ao longo do tempo"""
-    fig = px.line(df, x='date', y=metric, color='platform',
-                  title=f'Performance de {metric} ao longo do tempo')
+    import plotly.express as px
+    data = prepare_line_data(df, metric, by='platform')
+    fig = px.line(data, x='date', y=metric, color='platform',
+                  title=f'Performance de {metric} ao longo do tempo',
+                  render_mode='webgl' if use_webgl(len(data)) else 'svg')
     fig.update_layout(
         xaxis_title="Data",
         yaxis_title=metric.capitalize(),
@@ -33,9 +25,11 @@ def create_performance_chart(df, metric):
     )
     return fig
 
+@instrumented('chart.platform_comparison')
 def create_platform_comparison(df, metric):
     """Cria gráfico de barras comparando plataformas"""
-    comparison = df.groupby('platform')[metric].sum().reset_index()
+    import plotly.express as px
+    comparison = df.groupby('platform', observed=True)[metric].sum().reset_index()
     fig = px.bar(comparison, x='platform', y=metric,
                  title=f'Comparação de {metric} por Plataforma',
                  color='platform')
@@ -47,9 +41,11 @@ def create_platform_comparison(df, metric):
     )
     return fig
 
+@instrumented('chart.campaign_distribution')
 def create_campaign_distribution(df):
     """Cria gráfico de pizza mostrando distribuição de investimento por campanha"""
-    distribution = df.groupby('campaign_name')['spend'].sum().reset_index()
+    import plotly.express as px
+    distribution = fold_long_tail(df, 'campaign_name', 'spend')
     fig = px.pie(distribution, values='spend', names='campaign_name',
                  title='Distribuição de Investimento por Campanha')
     fig.update_layout(template="plotly_white")
@@ -68,43 +64,21 @@ def format_number(value):
     return f"{int(value):,}"
 
 def export_to_excel(df):
-    """Exporta dados para Excel"""
+    """Exporta dados para Excel (modo somente escrita, em lotes)"""
+    from exporters import EXPORT_CHUNK_SIZE, write_excel
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Dados')
+    # range(0, 1, ...) mantém um lote (vazio) para DataFrames sem linhas: o cabeçalho sai com as colunas de df
+    write_excel((df.iloc[start:start + EXPORT_CHUNK_SIZE] for start in range(0, max(len(df), 1), EXPORT_CHUNK_SIZE)), output)
     return output.getvalue()
 
 def export_to_pdf(figures, metrics):
-    """Exporta dashboard para PDF"""
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Adicionar título
-    pdf.set_font('Arial', 'B', 16)
-    pdf.cell(0, 10, 'Relatório de Performance de Anúncios', 0, 1, 'C')
-    
-    # Adicionar métricas principais
-    pdf.set_font('Arial', '', 12)
-    pdf.cell(0, 10, f"Período: {metrics['period']}", 0, 1)
-    pdf.cell(0, 10, f"Investimento Total: {format_currency(metrics['total_spend'])}", 0, 1)
-    pdf.cell(0, 10, f"Total de Cliques: {format_number(metrics['total_clicks'])}", 0, 1)
-    pdf.cell(0, 10, f"Total de Conversões: {format_number(metrics['total_conversions'])}", 0, 1)
-    
-    # Adicionar gráficos
-    for fig in figures:
-        img_path = f"temp_{datetime.now().strftime('%Y%m%d%H%M%S')}.png"
-        fig.write_image(img_path)
-        pdf.add_page()
-        pdf.image(img_path, x=10, y=10, w=190)
-        import os
-        os.remove(img_path)
-    
-    output = io.BytesIO()
-    pdf.output(output)
-    return output.getvalue()
+    """Exporta dashboard para PDF (gráficos rasterizados em paralelo e em memória)"""
+    from report_renderer import render_pdf
+    return render_pdf(figures, metrics)
 
 def create_date_filters():
     """Cria filtros de data para o dashboard"""
+    import streamlit as st
     col1, col2 = st.columns(2)
     with col1:
         start_date = st.date_input(
@@ -118,8 +92,18 @@ def create_date_filters():
         )
     return start_date, end_date
 
+def create_drilldown_filters(accounts):
+    """Contas e trecho do nome da campanha para detalhar o painel"""
+    import streamlit as st
+    with st.expander("Detalhar por conta e campanha"):
+        chosen = st.multiselect("Contas", list(accounts), default=list(accounts),
+                                format_func=lambda account: f"{account[0]} · {account[1]}")
+        search = st.text_input("Nome da campanha contém")
+    return tuple(chosen), search.strip()
+
 def create_platform_filter():
     """Cria filtro de plataforma"""
+    import streamlit as st
     return st.multiselect(
         "Plataformas",
         ["Facebook", "Google"],